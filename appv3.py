@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
 
+from excel_io import read_excel
+
 # ========================================
 # PAGE CONFIGURATION
 # ========================================
@@ -242,14 +244,14 @@ def sequence_colors_smartly(badges_df):
 def process_orders_and_generate_plan(customer_file):
     """Returns (results_dict, not_matched_df, error_msg_or_none)"""
     try:
-        machines = pd.read_excel(MACHINE_FILE_PATH)
+        machines = read_excel(MACHINE_FILE_PATH)
     except FileNotFoundError:
         return None, None, "Machine configuration file not found at ./reports/machine.xlsx"
     except Exception as e:
         return None, None, f"Error loading machine file: {str(e)}"
 
     try:
-        orders = pd.read_excel(customer_file, sheet_name="Sheet1")
+        orders = read_excel(customer_file, sheet_name="Sheet1")
     except Exception as e:
         return None, None, f"Error reading customer file: {str(e)}"
 
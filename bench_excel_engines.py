@@ -0,0 +1,98 @@
+# bench_excel_engines.py
+#
+# Compares Excel engines on the machine workbook and any order files given:
+#   python bench_excel_engines.py [orders.xlsx ...]
+# Every sheet is read through the excel_io helpers the apps use, once per engine:
+#   parse_sheet(header=None, nrows=SNIFF_ROWS)  the order loader's header sniff
+#   parse_sheet(header=None)                    the order loader's full parse
+#   read_excel(header=0)                        how the machine workbook is read
+# The frames from each engine must be identical.
+
+import sys
+import time
+import importlib.util
+
+import pandas as pd
+
+from excel_io import open_excel, parse_sheet, read_excel
+
+MACHINE_FILE_PATH = "./reports/updated_machine_data.xlsx"
+ENGINES = ["openpyxl", "calamine"]
+SNIFF_ROWS = 60  # HEADER_SNIFF_ROWS in the apps
+REPEATS = 3
+
+
+def available_engines():
+    engines = []
+    for engine in ENGINES:
+        module = "python_calamine" if engine == "calamine" else engine
+        if importlib.util.find_spec(module) is not None:
+            engines.append(engine)
+    return engines
+
+
+def read_cases(path, sheet):
+    """(label, reader(engine) -> (frame, engine actually used)) for each way the apps read a sheet."""
+    def sniff(engine):
+        xls = open_excel(path, engine=engine)
+        return parse_sheet(xls, sheet, header=None, nrows=SNIFF_ROWS), xls.engine
+
+    def full(engine):
+        xls = open_excel(path, engine=engine)
+        return parse_sheet(xls, sheet, header=None), xls.engine
+
+    def header0(engine):
+        used = open_excel(path, engine=engine).engine  # read_excel falls back the same way
+        return read_excel(path, engine=engine, sheet_name=sheet, header=0), used
+
+    return [("parse_sheet sniff", sniff), ("parse_sheet full", full), ("read_excel header=0", header0)]
+
+
+def time_read(reader, engine):
+    best, result = None, None
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        result = reader(engine)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_file(path, engines):
+    sheets = open_excel(path, engine=engines[0]).sheet_names
+    rows = []
+    for sheet in sheets:
+        for label, reader in read_cases(path, sheet):
+            timings, frames, used = {}, {}, {}
+            for engine in engines:
+                timings[engine], (frames[engine], used[engine]) = time_read(reader, engine)
+            identical = True
+            for engine in engines[1:]:
+                try:
+                    pd.testing.assert_frame_equal(frames[engines[0]], frames[engine])
+                except AssertionError:
+                    identical = False
+            row = {"file": path, "sheet": sheet, "read": label, "rows": len(frames[engines[0]])}
+            row.update({f"{e}_s": round(timings[e], 4) for e in engines})
+            if len(engines) > 1:
+                row["speedup"] = round(timings[engines[0]] / max(timings[engines[-1]], 1e-9), 1)
+            row["fell_back"] = ",".join(e for e in engines if used[e] != e)
+            row["identical"] = identical
+            rows.append(row)
+    return rows
+
+
+def main(paths):
+    engines = available_engines()
+    if len(engines) < 2:
+        print(f"Only {engines} installed; install python-calamine (pandas >= 2.2) to compare engines.")
+    rows = []
+    for path in [MACHINE_FILE_PATH] + paths:
+        rows.extend(bench_file(path, engines))
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+    return 0 if report["identical"].all() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
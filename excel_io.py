@@ -0,0 +1,60 @@
+# excel_io.py
+#
+# Excel reading shared by the planning apps and bench_excel_engines.py: calamine when
+# python-calamine is installed (pandas >= 2.2), pandas' default engine otherwise or when
+# the fast reader fails on a file.
+
+import pandas as pd
+
+
+def _pick_excel_engine():
+    """python-calamine is a compiled reader; pandas gained the 'calamine' engine in 2.2."""
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return None
+    major, minor = (int(p) for p in pd.__version__.split(".")[:2])
+    return "calamine" if (major, minor) >= (2, 2) else None
+
+
+EXCEL_ENGINE = _pick_excel_engine()
+
+
+def _trim_padded_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """calamine pads rows to the sheet's used width; openpyxl stops at the last filled cell."""
+    keep = len(df.columns)
+    while keep and df.iloc[:, keep - 1].isna().all() and df.columns[keep - 1] in (keep - 1, f"Unnamed: {keep - 1}"):
+        keep -= 1
+    return df.iloc[:, :keep] if keep < len(df.columns) else df
+
+
+def read_excel(source, engine=EXCEL_ENGINE, **kwargs) -> pd.DataFrame:
+    """pd.read_excel on `engine`, retried on the default engine if that reader fails."""
+    if engine:
+        try:
+            df = pd.read_excel(source, engine=engine, **kwargs)
+            return _trim_padded_columns(df) if engine == "calamine" else df
+        except FileNotFoundError:
+            raise
+        except Exception:
+            if hasattr(source, "seek"):
+                source.seek(0)
+    return pd.read_excel(source, **kwargs)
+
+
+def open_excel(source, engine=EXCEL_ENGINE) -> pd.ExcelFile:
+    """pd.ExcelFile on `engine`, with the same fallback as read_excel; read its sheets with parse_sheet."""
+    if engine:
+        try:
+            return pd.ExcelFile(source, engine=engine)
+        except FileNotFoundError:
+            raise
+        except Exception:
+            if hasattr(source, "seek"):
+                source.seek(0)
+    return pd.ExcelFile(source)
+
+
+def parse_sheet(xls: pd.ExcelFile, sheet_name, **kwargs) -> pd.DataFrame:
+    df = xls.parse(sheet_name=sheet_name, **kwargs)
+    return _trim_padded_columns(df) if xls.engine == "calamine" else df
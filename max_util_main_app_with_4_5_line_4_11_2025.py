@@ -7,6 +7,8 @@ import io
 from datetime import datetime, timedelta
 import plotly.express as px
 
+from excel_io import read_excel, open_excel
+
 # ========================================
 # PAGE CONFIGURATION
 # ========================================
@@ -414,16 +416,16 @@ def sequence_colors_smartly(badges_df):
 # ========================================
 def load_customer_orders(customer_file) -> (pd.DataFrame, str):
     try:
-        xls = pd.ExcelFile(customer_file)
+        xls = open_excel(customer_file)
     except Exception as e:
         return None, f"Error opening Excel file: {e}"
 
     selected_df, best_hit = None, -1
     for sheet in xls.sheet_names:
         try:
-            raw = pd.read_excel(customer_file, sheet_name=sheet, header=None)
+            raw = read_excel(customer_file, sheet_name=sheet, header=None)
             hdr_row = _detect_header_row(raw)
-            df = pd.read_excel(customer_file, sheet_name=sheet, header=hdr_row)
+            df = read_excel(customer_file, sheet_name=sheet, header=hdr_row)
             df = df.dropna(how="all")
             df = _standardize_columns(df)
             hit = sum(1 for c in REQUIRED_STD_COLS if c in df.columns)
@@ -459,7 +461,7 @@ def load_customer_orders(customer_file) -> (pd.DataFrame, str):
 def process_orders_and_generate_plan(customer_file):
     """Returns (results_dict, not_matched_df, error_msg_or_none)"""
     try:
-        machines = pd.read_excel(MACHINE_FILE_PATH)
+        machines = read_excel(MACHINE_FILE_PATH)
     except FileNotFoundError:
         return None, None, "Machine configuration file not found at ./reports/machine.xlsx"
     except Exception as e:
@@ -2,13 +2,28 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import math
+import time
 import io
+import os
 import re
+import hashlib
+import json
+import functools
+import csv
+from array import array
 from typing import Tuple, List, Optional
 from datetime import datetime, timedelta
 import plotly.express as px
 
+from excel_io import read_excel, open_excel, parse_sheet
+
+try:
+    from ortools.sat.python import cp_model
+except ImportError:  # optimizing scheduler unavailable; greedy plan only
+    cp_model = None
+
 # ========================================
 # PAGE CONFIGURATION
 # ========================================
@@ -73,12 +88,11 @@ COLUMN_ALIASES = {
 
 REQUIRED_STD_COLS = ["PI NO", "Yarn Count", "Composition", "Yarn Type", "Quantity"]
 
-# Composition normalization map
+# Composition normalization map: one entry per blend; fibre order, case, spacing and ®/™ don't matter
 BLEND_MAPPING = {
     "70% CYCLO® Recycled Cotton 30% Recycled Polyester": "70/30 CYL Cot/poly",
     "70% CYCLO® Recycled Cotton 30% Polyester": "70/30 CYL Cot/poly",
-    "30% Polyester 70% CYCLO® Recycled Cotton": "70/30 CYL Cot/poly",
-    "70% CYCLO® Recycled Cotton 30% Recycled Polyester 0.001% Tracer Fibers": "70/30 CYL Cot/poly",
+    "70% CYCLO® Recycled Cotton 30% Recycled Polyester 0.001% Tracer Fibers": "70/30 CYL Cot/poly Fiber tracer 0.001%",
     "80% CYCLO® Recycled Cotton 20% Recycled Polyester": "80/20 CYL Cot/poly",
     "80% CYCLO® Recycled Cotton 20% Polyester": "80/20 CYL Cot/poly",
     "90% CYCLO® Recycled Cotton 10% Recycled Polyester": "90/10 CYL Cot/poly",
@@ -89,122 +103,68 @@ BLEND_MAPPING = {
     "50% CYCLO® Recycled Cotton 50% Polyester": "50/50 CYL Cot/poly",
     "80% CYCLO® Recycled Cotton 20% Recycled Polyester 0.001% Tracer Fibers": "80/20 CYL Cot/poly Fiber tracer 0.001%",
     "80% CYCLO® Recycled Cotton 20% Polyester 0.001% Tracer Fibers": "80/20 CYL Cot/poly Fiber tracer 0.001%",
-    "70% CYCLO® Recycled Cotton 30% Recycled Polyester 0.001% Tracer Fibers": "70/30 CYL Cot/poly Fiber tracer 0.001%",
     "50% CYCLO® Recycled Cotton 30% Recycled Polyester 20% Nylon": "50/30/20 CYL Cot/poly/nylon",
     "50% CYCLO® Recycled Cotton 50% Recycled Polyester 0.001% Tracer Fibers": "50/50 CYL Cot/poly Fiber tracer 0.001%",
     "50% CYCLO® Recycled Cotton 50% Polyester 0.001% Tracer Fibers": "50/50 CYL Cot/poly Fiber tracer 0.001%",
-    "50% CYCLO® Recycled Cotton  50% ECOVERO™ Viscose":"50/50 ECOVERO™ Viscose/Cyl Cot",
-    "50% ECOVERO™ Viscose 50% CYCLO® Recycled Cotton  ":"50/50 ECOVERO™ Viscose/Cyl Cot",
-    "50% CYCLO® Recycled Cotton   50% Liva Reviva™ Viscose":"50/50 Liva Reviva™ Viscose/Cyl Cot",
-    "50% Liva Reviva™ Viscose 50% CYCLO® Recycled Cotton":"50/50 Liva Reviva™ Viscose/Cyl Cot",
-    "50% CYCLO® Recycled Cotton 50% Lyocell":"50/50 Lyocell/Cyl Cot",
-    "50% Lyocell 50% CYCLO® Recycled Cotton ":"50/50 Lyocell/Cyl Cot",
-    "50% CYCLO® Recycled Cotton   50% Organic Cotton":"50/50 Org/Cyl Cot",
-    "50% Organic Cotton 50% CYCLO® Recycled Cotton":"50/50 Org/Cyl Cot",
-    "50% CYCLO® Recycled Cotton   50% Virgin Cotton":"50/50 CYL Cot/Virgin Cot",
-    "50% Virgin Cotton 50% CYCLO® Recycled Cotton":"50/50 CYL Cot/Virgin Cot",
-    "55% CYCLO® Recycled Cotton   30% Virgin Cotton 15% Polyester":"55/30/15 CYL Cot/Virgin Cot/poly",
-    "60% CYCLO® Recycled Cotton   20% Viscose 20% Nylon":"60/20/20 CYL Cot/Viscose/Nylon",
-    "60% CYCLO® Recycled Cotton   40% Recycled Polyester":"60/40 CYL Cot/poly",
-    "70% CYCLO® Recycled Cotton   30% Acrylic":"70/30 CYL Cot/Acrylic",
-    "50% CYCLO® Recycled Cotton 50% Bamboo":"50/50 Bamboo/Cyl Cot",
-    "50% Bamboo 50% CYCLO® Recycled Cotton":"50/50 Bamboo/Cyl Cot",
-    "70% CYCLO® Recycled Cotton   30% Bamboo Viscose":"30/70 Bamboo Viscose/Cyl Cot",
-    "30% Bamboo Viscose 70% CYCLO® Recycled Cotton":"30/70 Bamboo Viscose/Cyl Cot",
-    "70% CYCLO® Recycled Cotton   30% Liva Reviva™ Viscose":"30/70 Liva Reviva™ Viscose/Cyl Cot",
-    "30% Liva Reviva™ Viscose 70% CYCLO® Recycled Cotton":"30/70 Liva Reviva™ Viscose/Cyl Cot",
-    "90% CYCLO® Recycled Cotton   10% Tencel™":"90/10 CYL Cot/Tencel™",
-    "10% Tencel™ 90% CYCLO® Recycled Cotton":"90/10 CYL Cot/Tencel™",
-    "60% CYCLO® Recycled Cotton 40% Polyester":"60/40 CYL Cot/poly",
-    "40% Polyester 60% CYCLO® Recycled Cotton ":"60/40 CYL Cot/poly",
-    "70% Organic Cotton 30% CYCLO® Recycled Cotton":"70/30 Org/Cyl Cot",
-    "30% CYCLO® Recycled Cotton 70% Organic Cotton":"70/30 Org/Cyl Cot",
-    "52% CYCLO® Recycled Cotton 27% Polyester 21% Nylon":"52/27/23 CYL Cot/poly/nylon",
-    "70% CYCLO® Recycled Cotton 30% Lyocell":"30/70 Lyocell/Cyl Cot",
-    "30% Lyocell 70% CYCLO® Recycled Cotton ":"30/70 Lyocell/Cyl Cot",
-    "70% CYCLO® Recycled Cotton 20% Linen 10% Viscose":"70/20/10 CYL Cot/Linen/Viscose",
-    "70% CYCLO® Recycled Cotton 30% Recycled Polyester (BPA free)":"70/30 CYL Cot/poly",
-    "30% Recycled Polyester 70% CYCLO® Recycled Cotton (BPA free)":"70/30 CYL Cot/poly",    
-    "45% CYCLO® Recycled Cotton 40% Recycled Polyester 15% Post Consumer Recycled Cotton Polyester":"45/40/15 CYL Cot/ploy/PCW Cot/poly" ,
-    "50% Organic Cotton 35% CYCLO® Recycled Cotton 15% Post Consumer Recycled Cotton":"45/40/15 CYL Cot/ploy/PCW Cot/poly",
-    "50% BCI Cotton 50% CYCLO® Recycled Cotton":"50/50 BCI/Cyl Cot",
-    "50% CYCLO® Recycled Cotton 50% BCI Cotton":"50/50 BCI/Cyl Cot",
-    "65% BCI Cotton 20% CYCLO® Recycled Cotton 15% Ecovero Viscose Mélange":"65/20/15 BCI Cot/CYL cot/Ecovero  Viscose Mélange",
-    "80% BCI Cotton 20% CYCLO® Recycled Cotton":"80/20 BCI/Cyl Cot",
-    "20% CYCLO® Recycled Cotton 80% BCI Cotton ":"80/20 BCI/Cyl Cot",
-    "70% BCI Cotton 30% CYCLO® Recycled Cotton":"70/30 BCI/Cyl Cot",
-    "30% CYCLO® Recycled Cotton 70% BCI Cotton ":"70/30 BCI/Cyl Cot",
-    "50% CYCLO® Recycled Cotton 50% Acrylic":"50/50 CYL Cot/Acrylic",
-    "50% Acrylic 50% CYCLO® Recycled Cotton":"50/50 CYL Cot/Acrylic",
-    "50% CYCLO® Recycled Cotton   50% Recycled Polyester":"50/50 CYL Cot/poly",
-    "50% Recycled Polyester 50% CYCLO® Recycled Cotton":"50/50 CYL Cot/poly",
-    "50% CYCLO® Recycled Cotton 50% Viscose":"50/50 Bamboo Viscose/Cyl Cot",
-    "50% Viscose 50% CYCLO® Recycled Cotton":"50/50 Bamboo Viscose/Cyl Cot",
-    "55% CYCLO® Recycled Cotton   45% Recycled Polyester":"55/45 CYL Cot/poly",
-    "45% Recycled Polyester 55% CYCLO® Recycled Cotton ":"55/45 CYL Cot/poly",
-    "60% CYCLO® Recycled Cotton  40% Nylon":"60/40 CYL Cot/nylon",
-    " 40% Nylon 60% CYCLO® Recycled Cotton  ":"60/40 CYL Cot/nylon",
-    "60% CYCLO® Recycled Cotton   40% Virgin Cotton":"60/40 CYL Cot/Virgin Cot",
-    "40% Virgin Cotton 60% CYCLO® Recycled Cotton":"60/40 CYL Cot/Virgin Cot",
-    "65% CYCLO® Recycled Cotton 35% Organic Cotton Tracer Fibers":"35/65 BCI/Cyl Cot",
-    "65% CYCLO® Recycled Cotton 35% Polyester":" 65/35 CYL Cot/poly",
-    "35% Polyester 65% CYCLO® Recycled Cotton":" 65/35 CYL Cot/poly",
-    "70% CYCLO® Recycled Cotton   30% Virgin Cotton":"30/70 Virgin Cot/Cyl Cot",
-    "30% Virgin Cotton 70% CYCLO® Recycled Cotton":"30/70 Virgin Cot/Cyl Cot",
-    "70% CYCLO® Recycled Cotton   30% Viscose":"30/70  Viscose/Cyl Cot",
-    "30% Viscose 70% CYCLO® Recycled Cotton":"30/70  Viscose/Cyl Cot",
-    "97% CYCLO® Recycled Cotton   3% Recycled Polyester":"97/3 CYL Cot/poly",
-    "3% Recycled Polyester 97% CYCLO® Recycled Cotton":"97/3 CYL Cot/poly",
-    "80% Organic Cotton 20% Recycled Polyester":"80/20 Org Cot/poly",
-    "20% Recycled Polyester 80% Organic Cotton":"80/20 Org Cot/poly",
-    "50% CYCLO® Recycled Cotton 30% BCI Cotton 20% Recycled Polyester":"50/20/30 CYL Cot/BCI Cot/poly",
-    "30% BCI Cotton 20% Recycled Polyester 50% CYCLO® Recycled Cotton":"50/20/30 CYL Cot/BCI Cot/poly",
-    "65% CYCLO® Recycled Cotton 35% Recycled Polyester":"65/35 CYL Cot/poly",
-    "35% Recycled Polyester 65% CYCLO® Recycled Cotton":"65/35 CYL Cot/poly",
-    "65% Recycled Polyester 35% BCI Cotton":"65/35 poly/BCI",
-    "35% BCI Cotton 65% Recycled Polyester":"65/35 poly/BCI",
-    "60% Organic Cotton 40% Polyester":"60/40 Org/poly",
-    "40% Polyester 60% Organic Cotton":"60/40 Org/poly",
-    "73% CYCLO® Recycled Cotton 25% Recycled Polyester 2% Viscose":"73/25/2 CYL Cot/poly/Viscose",
-    "65% Polyester 35% Virgin Cotton":"65/35 poly/Virgin Cot",
-    "35% Virgin Cotton 65% Polyester":"65/35 poly/Virgin Cot",
-    "75% CYCLO® Recycled Cotton 25% Polyester":"75/25 CYL Cot/poly",
-    "25% Polyester 75% CYCLO® Recycled Cotton":"75/25 CYL Cot/poly",
-    "60% Organic Cotton 40% Recycled Polyester":"60/40 Org/poly",
-    "40% Recycled Polyester 60% Organic Cotton":"60/40 Org/poly",
-    "60% CYCLO® Recycled Cotton 30% Recycled Polyester 10% Viscose":"60/30/10 CYL Cot/poly/Viscose",
-    "60% CYCLO® Recycled Cotton 40% Acrylic":" 60/40 CYL Cot/Acrylic",
-    "40% Acrylic 60% CYCLO® Recycled Cotton":" 60/40 CYL Cot/Acrylic",
-    "55% CYCLO® Recycled Cotton 25% Polyester 20% Nylon":"55/25/20 CYL Cot/poly/nylon",
-    "25% Polyester 20% Nylon 55% CYCLO® Recycled Cotton":"55/25/20 CYL Cot/poly/nylon",
-    "70% CYCLO® Recycled Cotton 30% Viscose":"30/70  Viscose/Cyl Cot",
-    "30% Viscose 70% CYCLO® Recycled Cotton":"30/70  Viscose/Cyl Cot",
-    "75% CYCLO® Recycled Cotton 25% Recycled Polyester":"75/25 CYL Cot/poly",
-    "25% Recycled Polyester 75% CYCLO® Recycled Cotton":"75/25 CYL Cot/poly",
-    "65% Recycled Polyester 35% Organic Cotton":"65/35 poly/Org",
-    "35% Organic Cotton 65% Recycled Polyester":"65/35 poly/Org",
-    "60% BCI Cotton 40% Recycled Polyester":"60/40 BCI/poly",
-    "40% Recycled Polyester 60% BCI Cotton":"60/40 BCI/poly",
-    "70% Virgin Cotton 30% CYCLO® Recycled Cotton":" 70/30 Virgin/Cyl Cot",
-    "30% CYCLO® Recycled Cotton 70% Virgin Cotton":" 70/30 Virgin/Cyl Cot",
-    "60% Virgin Cotton 40% CYCLO® Recycled Cotton":"60/40 Virgin/Cyl Cot",
-    "40% CYCLO® Recycled Cotton 60% Virgin Cotton":"60/40 Virgin/Cyl Cot",
-    "75% BCI Cotton 20% CYCLO® Recycled Cotton 5% Ecovero Viscose Mélange":"75/20/5 BCI Cot/CYL cot/Ecovero  Viscose Mélange",
-    "70% CYCLO® Recycled Cotton 30% Nylon":" 70/20 CYL Cot/nylon",
-    "30% Nylon 70% CYCLO® Recycled Cotton":" 70/20 CYL Cot/nylon",
-    "75% Organic Cotton 25% CYCLO® Recycled Cotton":"75/25 BCI/Cyl Cot",
-    "25% CYCLO® Recycled Cotton 75% Organic Cotton":"75/25 BCI/Cyl Cot",
-    "50% Recycled Polyester 35% CYCLO® Recycled Cotton 15% Post Consumer Recycled Cotton":"35/50/15 CYL Cot/ploy/PCW Cot",
-    "65% Recycled Polyester 35% CYCLO® Recycled Cotton":"35/65 CYL Cot/poly",
-    "35% CYCLO® Recycled Cotton 65% Recycled Polyester":"35/65 CYL Cot/poly",
-    "50% Recycled Polyester 35% CYCLO® Recycled Cotton 15% Post Consumer (65% Cotton 35% Polyester)":"35/50/15 CYL Cot/ploy/PCW Cot/poly",  
-    "50% CYCLO® Recycled Cotton 50% Organic Cotton":"50/50 Org/Cyl Cot",
-    "50% Organic Cotton 50% CYCLO® Recycled Cotton":"50/50 Org/Cyl Cot",
-    "60% CYCLO® Recycled Cotton 20% Viscose 20% Nylon":"60/20/20 CYL Cot/Viscose/Nylon",
-    "100% CYCLO® Recycled Cotton":"100 CYL Cot",
-    "50% CYCLO® Recycled Cotton 25% Recycled Polyester 25% Viscose":"50/25/25 CYL Cot/poly/Viscose",
-    "50% BCI Cotton 50% Recycled Polyester":"50/50 BCI Cot/poly",
-    "50% Recycled Polyester 50% BCI Cotton":"50/50 BCI Cot/poly",
+    "50% CYCLO® Recycled Cotton 50% ECOVERO™ Viscose": "50/50 ECOVERO™ Viscose/Cyl Cot",
+    "50% CYCLO® Recycled Cotton 50% Liva Reviva™ Viscose": "50/50 Liva Reviva™ Viscose/Cyl Cot",
+    "50% CYCLO® Recycled Cotton 50% Lyocell": "50/50 Lyocell/Cyl Cot",
+    "50% CYCLO® Recycled Cotton 50% Organic Cotton": "50/50 Org/Cyl Cot",
+    "50% CYCLO® Recycled Cotton 50% Virgin Cotton": "50/50 CYL Cot/Virgin Cot",
+    "55% CYCLO® Recycled Cotton 30% Virgin Cotton 15% Polyester": "55/30/15 CYL Cot/Virgin Cot/poly",
+    "60% CYCLO® Recycled Cotton 20% Viscose 20% Nylon": "60/20/20 CYL Cot/Viscose/Nylon",
+    "70% CYCLO® Recycled Cotton 30% Acrylic": "70/30 CYL Cot/Acrylic",
+    "50% CYCLO® Recycled Cotton 50% Bamboo": "50/50 Bamboo/Cyl Cot",
+    "70% CYCLO® Recycled Cotton 30% Bamboo Viscose": "30/70 Bamboo Viscose/Cyl Cot",
+    "70% CYCLO® Recycled Cotton 30% Liva Reviva™ Viscose": "30/70 Liva Reviva™ Viscose/Cyl Cot",
+    "90% CYCLO® Recycled Cotton 10% Tencel™": "90/10 CYL Cot/Tencel™",
+    "70% Organic Cotton 30% CYCLO® Recycled Cotton": "70/30 Org/Cyl Cot",
+    "52% CYCLO® Recycled Cotton 27% Polyester 21% Nylon": "52/27/23 CYL Cot/poly/nylon",
+    "70% CYCLO® Recycled Cotton 30% Lyocell": "30/70 Lyocell/Cyl Cot",
+    "70% CYCLO® Recycled Cotton 20% Linen 10% Viscose": "70/20/10 CYL Cot/Linen/Viscose",
+    "70% CYCLO® Recycled Cotton 30% Recycled Polyester (BPA free)": "70/30 CYL Cot/poly",
+    "45% CYCLO® Recycled Cotton 40% Recycled Polyester 15% Post Consumer Recycled Cotton Polyester": "45/40/15 CYL Cot/ploy/PCW Cot/poly",
+    "50% Organic Cotton 35% CYCLO® Recycled Cotton 15% Post Consumer Recycled Cotton": "45/40/15 CYL Cot/ploy/PCW Cot/poly",
+    "50% BCI Cotton 50% CYCLO® Recycled Cotton": "50/50 BCI/Cyl Cot",
+    "65% BCI Cotton 20% CYCLO® Recycled Cotton 15% Ecovero Viscose Mélange": "65/20/15 BCI Cot/CYL cot/Ecovero  Viscose Mélange",
+    "80% BCI Cotton 20% CYCLO® Recycled Cotton": "80/20 BCI/Cyl Cot",
+    "70% BCI Cotton 30% CYCLO® Recycled Cotton": "70/30 BCI/Cyl Cot",
+    "50% CYCLO® Recycled Cotton 50% Acrylic": "50/50 CYL Cot/Acrylic",
+    "50% CYCLO® Recycled Cotton 50% Viscose": "50/50 Bamboo Viscose/Cyl Cot",
+    "55% CYCLO® Recycled Cotton 45% Recycled Polyester": "55/45 CYL Cot/poly",
+    "60% CYCLO® Recycled Cotton 40% Nylon": "60/40 CYL Cot/nylon",
+    "60% CYCLO® Recycled Cotton 40% Virgin Cotton": "60/40 CYL Cot/Virgin Cot",
+    "65% CYCLO® Recycled Cotton 35% Organic Cotton Tracer Fibers": "35/65 BCI/Cyl Cot",
+    "65% CYCLO® Recycled Cotton 35% Polyester": " 65/35 CYL Cot/poly",
+    "70% CYCLO® Recycled Cotton 30% Virgin Cotton": "30/70 Virgin Cot/Cyl Cot",
+    "70% CYCLO® Recycled Cotton 30% Viscose": "30/70  Viscose/Cyl Cot",
+    "97% CYCLO® Recycled Cotton 3% Recycled Polyester": "97/3 CYL Cot/poly",
+    "80% Organic Cotton 20% Recycled Polyester": "80/20 Org Cot/poly",
+    "50% CYCLO® Recycled Cotton 30% BCI Cotton 20% Recycled Polyester": "50/20/30 CYL Cot/BCI Cot/poly",
+    "65% CYCLO® Recycled Cotton 35% Recycled Polyester": "65/35 CYL Cot/poly",
+    "65% Recycled Polyester 35% BCI Cotton": "65/35 poly/BCI",
+    "60% Organic Cotton 40% Polyester": "60/40 Org/poly",
+    "73% CYCLO® Recycled Cotton 25% Recycled Polyester 2% Viscose": "73/25/2 CYL Cot/poly/Viscose",
+    "65% Polyester 35% Virgin Cotton": "65/35 poly/Virgin Cot",
+    "75% CYCLO® Recycled Cotton 25% Polyester": "75/25 CYL Cot/poly",
+    "60% Organic Cotton 40% Recycled Polyester": "60/40 Org/poly",
+    "60% CYCLO® Recycled Cotton 30% Recycled Polyester 10% Viscose": "60/30/10 CYL Cot/poly/Viscose",
+    "60% CYCLO® Recycled Cotton 40% Acrylic": " 60/40 CYL Cot/Acrylic",
+    "55% CYCLO® Recycled Cotton 25% Polyester 20% Nylon": "55/25/20 CYL Cot/poly/nylon",
+    "75% CYCLO® Recycled Cotton 25% Recycled Polyester": "75/25 CYL Cot/poly",
+    "65% Recycled Polyester 35% Organic Cotton": "65/35 poly/Org",
+    "60% BCI Cotton 40% Recycled Polyester": "60/40 BCI/poly",
+    "70% Virgin Cotton 30% CYCLO® Recycled Cotton": " 70/30 Virgin/Cyl Cot",
+    "60% Virgin Cotton 40% CYCLO® Recycled Cotton": "60/40 Virgin/Cyl Cot",
+    "75% BCI Cotton 20% CYCLO® Recycled Cotton 5% Ecovero Viscose Mélange": "75/20/5 BCI Cot/CYL cot/Ecovero  Viscose Mélange",
+    "70% CYCLO® Recycled Cotton 30% Nylon": " 70/20 CYL Cot/nylon",
+    "75% Organic Cotton 25% CYCLO® Recycled Cotton": "75/25 BCI/Cyl Cot",
+    "50% Recycled Polyester 35% CYCLO® Recycled Cotton 15% Post Consumer Recycled Cotton": "35/50/15 CYL Cot/ploy/PCW Cot",
+    "65% Recycled Polyester 35% CYCLO® Recycled Cotton": "35/65 CYL Cot/poly",
+    "50% Recycled Polyester 35% CYCLO® Recycled Cotton 15% Post Consumer (65% Cotton 35% Polyester)": "35/50/15 CYL Cot/ploy/PCW Cot/poly",
+    "100% CYCLO® Recycled Cotton": "100 CYL Cot",
+    "50% CYCLO® Recycled Cotton 25% Recycled Polyester 25% Viscose": "50/25/25 CYL Cot/poly/Viscose",
+    "50% BCI Cotton 50% Recycled Polyester": "50/50 BCI Cot/poly",
 }
 
 NEAREST_FAMILIES = {
@@ -240,6 +200,14 @@ NEAREST_FAMILIES = {
     "Magenta": ["Pink", "Rose", "Purple"],
 }
 
+# Badge ordering before scheduling
+SEQUENCING_MODES = {"Colour first": "color", "Due date, colour-clustered": "due-window"}
+DUE_WINDOW_DAYS = 7
+
+# Changeover cost overrides between colour families: {("Red", "Pink"): 0.5, ...} (symmetric).
+# Pairs not listed are derived from NEAREST_FAMILIES (see build_changeover_costs).
+CHANGEOVER_COST_OVERRIDES = {}
+
 
 # ---------- Real five-line configuration ----------
 LINE_CONFIG = {
@@ -261,15 +229,36 @@ HORIZON_DAYS = 60
 # Per-line shift capacity (kg per shift)
 PER_SHIFT_CAPACITY = {ln: LINE_CONFIG[ln]["daily_capacity_kg"] / len(SHIFTS) for ln in LINES}
 
+# ---------- Scheduler selection ----------
+SCHEDULER_MODES = {"Greedy (fast)": "greedy", "CP-SAT optimizer": "cp-sat"}
+CPSAT_TIME_LIMIT_S = 30.0
+CPSAT_NUM_WORKERS = os.cpu_count() or 1
+PAIR_WINDOW_MIN = 24 * 60
+# CP-SAT solves in stages: fewest unscheduled badges, then fewest late badges, then changeovers plus
+# makespan. A changeover of CHANGEOVER_COST 1.0 weighs as much as CPSAT_CHANGEOVER_MIN minutes of makespan.
+CPSAT_CHANGEOVER_MIN = 60
+# Share of the time still left that each stage may use (the last stage gets the rest)
+CPSAT_STAGE_TIME_SHARE = (0.25, 0.35, 1.0)
+
 # MACHINE_FILE_PATH = "./reports/machine.xlsx"
 MACHINE_FILE_PATH = "./reports/updated_machine_data.xlsx"
 
+# Columnar cache of the machine workbook + per-line throughput table (rebuilt only when the workbook or LINE_CONFIG changes)
+MACHINE_CACHE_DIR = "./reports/.cache"
+MACHINE_CACHE_VERSION = 2
+MACHINE_CACHE_COLUMNS = ["Counts", "Blends", "Yarn Type", "twist factor", "rotor rpm"]
+# Counts missing from the catalogue are interpolated between neighbours at most this far apart
+COUNT_INTERPOLATION_MAX_GAP = 8
+
+# Order uploads: Excel is sniffed sheet by sheet, CSV is streamed in chunks, Parquet is read column-wise
+ORDER_FILE_TYPES = ["xlsx", "xls", "csv", "parquet"]
+CSV_CHUNK_ROWS = 50_000
+# Tried in order; Excel on Windows saves CSV as cp1252 (®, ™ in compositions), latin-1 decodes any byte
+CSV_ENCODINGS = ["utf-8-sig", "cp1252", "latin-1"]
+
 # ========================================
 # HELPERS
 # ========================================
-def round_up(val: float) -> float:
-    return math.ceil(val * 100) / 100
-
 def _alias_to_std(name: str) -> str:
     name = (name or "").strip()
     for std, alts in COLUMN_ALIASES.items():
@@ -277,15 +266,44 @@ def _alias_to_std(name: str) -> str:
             return std
     return name
 
+HEADER_SNIFF_ROWS = 60
+_HEADER_ALIASES = frozenset(a for alts in COLUMN_ALIASES.values() for a in alts)
+
 def _detect_header_row(df_noheader: pd.DataFrame) -> int:
-    target_aliases = {a for alts in COLUMN_ALIASES.values() for a in alts}
-    best_row, best_score = 0, 0
-    for r in range(min(60, len(df_noheader))):
-        vals = [str(x).strip() for x in df_noheader.iloc[r].tolist()]
-        score = sum(1 for v in vals if v in target_aliases)
-        if score > best_score:
-            best_row, best_score = r, score
-    return best_row
+    top = df_noheader.iloc[:HEADER_SNIFF_ROWS]
+    if top.empty:
+        return 0
+    scores = top.astype(str).apply(lambda col: col.str.strip()).isin(_HEADER_ALIASES).sum(axis=1).to_numpy()
+    return int(scores.argmax()) if scores.max() > 0 else 0
+
+def _header_names(values) -> list:
+    """Column names as read_excel(header=n) would build them from one row of cell values."""
+    names, seen = [], {}
+    for i, v in enumerate(values):
+        if isinstance(v, float) and v.is_integer():
+            v = int(v)  # numeric header cells come back as float when the column is float
+        name = f"Unnamed: {i}" if pd.isna(v) else v
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _frame_from_header_row(df_noheader: pd.DataFrame, hdr_row: int) -> pd.DataFrame:
+    """
+    Equivalent of re-reading a sheet with header=hdr_row, sliced from the header=None frame:
+    blank header cells become "Unnamed: i", repeated names get ".1", ".2", ... suffixes.
+    """
+    df = df_noheader.iloc[hdr_row + 1:].reset_index(drop=True)
+    if len(df_noheader):
+        df.columns = _header_names(df_noheader.iloc[hdr_row].tolist())
+    return df.infer_objects()
+
+def _required_hits(header_values) -> int:
+    names = {_alias_to_std(str(n)) for n in _header_names(header_values)}
+    return sum(1 for c in REQUIRED_STD_COLS if c in names)
 
 def _standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
     new_cols = []
@@ -310,14 +328,116 @@ def normalize_count(count_value):
 def _clean_text(s):
     return " ".join(str(s).split())
 
+def _map_unique(values: pd.Series, fn) -> pd.Series:
+    """fn applied once per distinct value (via factorize) and broadcast back to every row."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    mapped = np.array([fn(u) for u in uniques], dtype=object)
+    return pd.Series(mapped[codes], index=values.index, dtype=object)
+
+_BLEND_TOKEN = re.compile(r"(\d+(?:\.\d+)?)\s*%\s*(.*?)(?=\s*\d+(?:\.\d+)?\s*%|$)")
+_BLEND_QUALIFIER = re.compile(r"\(([^)]*)\)")
+
+def _join_per_group(codes: np.ndarray, values: pd.Series, n_groups: int, sep: str, distinct: bool = False) -> list:
+    """
+    values joined with sep per group code (from groupby.ngroup; rows with a negative code are skipped),
+    in row order. distinct=True joins the sorted distinct non-null values as str, None for groups with none.
+    """
+    frame = pd.DataFrame({"code": codes, "value": values.to_numpy(dtype=object)})
+    frame = frame[frame["code"] >= 0]
+    if distinct:
+        frame = frame[frame["value"].notna()]
+        frame = frame.assign(value=frame["value"].map(str)).drop_duplicates().sort_values(["code", "value"])
+    else:
+        frame = frame.sort_values("code", kind="stable")
+    out = [None if distinct else ""] * n_groups
+    code_arr, value_arr = frame["code"].to_numpy(), frame["value"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, code_arr[1:] != code_arr[:-1]]) if len(code_arr) else []
+    for start, end in zip(starts, list(starts[1:]) + [len(code_arr)]):
+        out[code_arr[start]] = sep.join(value_arr[start:end])
+    return out
+
+def _blend_key(s):
+    """
+    Order-independent lookup key for a composition: the sorted (percent, fibre) pairs plus any
+    parenthesised qualifiers, ignoring case, spacing and ® / ™. Text without percentages keys on itself.
+    """
+    text = " ".join(str(s).replace("®", "").replace("™", "").split()).casefold()
+    qualifiers = tuple(sorted(q.strip() for q in _BLEND_QUALIFIER.findall(text)))
+    tokens = _BLEND_TOKEN.findall(_BLEND_QUALIFIER.sub(" ", text))
+    if not tokens:
+        return text
+    return tuple(sorted((float(pct), " ".join(fibre.split())) for pct, fibre in tokens)), qualifiers
+
+# BLEND_MAPPING re-keyed once at import so normalize_blend is a single probe
+BLEND_LOOKUP = {_blend_key(k): v for k, v in BLEND_MAPPING.items()}
+
+@functools.lru_cache(maxsize=None)
 def normalize_blend(blend_raw: str) -> str:
-    clean_blend = _clean_text(blend_raw)
-    mapped = BLEND_MAPPING.get(clean_blend)
-    if mapped:
-        return mapped
-    try2 = clean_blend.replace("®", "").replace("™", "")
-    try2 = " ".join(try2.split())
-    return BLEND_MAPPING.get(try2, None)
+    return BLEND_LOOKUP.get(_blend_key(blend_raw)) or None
+
+# ---------- NEW: Fuzzy fallback for unmapped compositions ----------
+# Candidates must have the same percentages; the score is the worst per-fibre trigram similarity.
+BLEND_FUZZY_AUTO_SCORE = 0.80     # at or above: use the match and log it
+BLEND_FUZZY_SUGGEST_SCORE = 0.60  # at or above: leave unmatched but name the closest entry
+# Lowest accepted auto-apply setting: below it the closest entry can name a different fibre
+# ("60% Cotton 40% Polyester" -> BCI Cotton / Recycled Polyester scores 0.62), so those are only suggested
+BLEND_FUZZY_MIN_AUTO_SCORE = 0.70
+
+def _trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def _build_blend_fuzzy_index() -> dict:
+    """(percentages, qualifiers) -> [(((pct, fibre trigrams), ...), BLEND_MAPPING key, blend), ...]"""
+    index = {}
+    for entry, blend in BLEND_MAPPING.items():
+        key = _blend_key(entry)
+        if isinstance(key, str):
+            continue
+        pairs, qualifiers = key
+        fibres = tuple((pct, _trigrams(fibre)) for pct, fibre in pairs)
+        index.setdefault((tuple(pct for pct, _ in pairs), qualifiers), []).append((fibres, entry, blend))
+    return index
+
+BLEND_FUZZY_INDEX = _build_blend_fuzzy_index()
+
+@functools.lru_cache(maxsize=None)
+def fuzzy_match_blend(blend_raw: str) -> Tuple[Optional[str], Optional[str], float]:
+    """Closest BLEND_MAPPING entry for an unmapped composition: (entry, blend, score in 0..1)."""
+    key = _blend_key(blend_raw)
+    if isinstance(key, str):
+        return None, None, 0.0
+    pairs, qualifiers = key
+    query = [(pct, _trigrams(fibre)) for pct, fibre in pairs]
+    best = (None, None, 0.0)
+    for fibres, entry, blend in BLEND_FUZZY_INDEX.get((tuple(pct for pct, _ in pairs), qualifiers), ()):
+        score = 1.0
+        for pct, grams in query:
+            score = min(score, max(2 * len(grams & g) / (len(grams) + len(g)) for p, g in fibres if p == pct))
+        if score > best[2]:
+            best = (entry, blend, score)
+    return best
+
+def fuzzy_blend_decisions(compositions: pd.Series, auto_score: float = BLEND_FUZZY_AUTO_SCORE) -> pd.DataFrame:
+    """
+    One row per distinct unmapped composition that has a candidate at or above BLEND_FUZZY_SUGGEST_SCORE.
+    auto_score is raised to BLEND_FUZZY_MIN_AUTO_SCORE if set lower.
+    """
+    auto_score = max(auto_score, BLEND_FUZZY_MIN_AUTO_SCORE)
+    rows = []
+    for comp, n_orders in compositions.value_counts(sort=False).items():
+        entry, blend, score = fuzzy_match_blend(comp)
+        if entry is None or score < BLEND_FUZZY_SUGGEST_SCORE:
+            continue
+        rows.append({
+            "composition": comp,
+            "matched_entry": entry,
+            "blend": blend,
+            "score": round(score, 3),
+            "decision": "auto-applied" if score >= auto_score else "suggested",
+            "orders": int(n_orders),
+        })
+    return pd.DataFrame(rows, columns=["composition", "matched_entry", "blend", "score", "decision", "orders"])
 
 def ensure_date(dt):
     if pd.isna(dt):
@@ -349,121 +469,234 @@ def explode_double_yarn(df: pd.DataFrame) -> pd.DataFrame:
     Split orders whose Color Code is 'A + B' into two half-rows (A and B) with shared pair_id.
     Also replace 'Color Code' for each half with the concrete single colour, so batching works naturally.
     """
-    rows = []
-    for idx, r in df.iterrows():
-        qty = float(r.get("Quantity", 0) or 0)
-        cc = r.get("Color Code")
-        is_double, left, right = is_double_yarn(cc)
-        if is_double and qty > 0:
-            half = qty / 2.0
-            # pair id uses PI NO if present else row index; incorporates colours for traceability
-            pair_id = f"PAIR-{str(r.get('PI NO') or idx)}-{left}-{right}"
-            # member A
-            na = r.copy()
-            na["Quantity"] = half
-            na["pair_id"] = pair_id
-            na["pair_member"] = "A"
-            na["pair_color"] = left
-            na["Color Code"] = left
-            rows.append(na)
-            # member B
-            nb = r.copy()
-            nb["Quantity"] = half
-            nb["pair_id"] = pair_id
-            nb["pair_member"] = "B"
-            nb["pair_color"] = right
-            nb["Color Code"] = right
-            rows.append(nb)
-        else:
-            newr = r.copy()
-            newr["pair_id"] = None
-            newr["pair_member"] = None
-            newr["pair_color"] = None
-            rows.append(newr)
-    return pd.DataFrame(rows)
+    n = len(df)
+    qty = pd.to_numeric(df["Quantity"], errors="coerce") if "Quantity" in df.columns else pd.Series(0.0, index=df.index)
+    if "Color Code" in df.columns:
+        parts = df["Color Code"].astype(str).str.strip().str.extract(DOUBLE_YARN_REGEX)
+        left, right = parts[0].str.strip(), parts[1].str.strip()
+        is_double = (left.notna() & (qty > 0)).to_numpy()
+    else:
+        left = right = pd.Series(None, index=df.index, dtype=object)
+        is_double = np.zeros(n, dtype=bool)
+
+    # pair id uses PI NO if present else row index; incorporates colours for traceability
+    pair_key = pd.Series(df.index.map(str), index=df.index, dtype=object)
+    if "PI NO" in df.columns:
+        pi = df["PI NO"].astype(object)
+        pair_key = pi.map(str).where(pi.map(bool), pair_key)
+    pair_id = "PAIR-" + pair_key + "-" + left + "-" + right
+
+    # doubles appear twice (member A then member B), everything else once, in the original order
+    src = np.repeat(np.arange(n), np.where(is_double, 2, 1))
+    member_b = np.r_[False, src[1:] == src[:-1]] if len(src) else np.zeros(0, dtype=bool)
+    dbl = is_double[src]
+    out = df.iloc[src].copy()
+
+    none = np.full(len(src), None, dtype=object)
+    pair_color = np.where(member_b, right.to_numpy(dtype=object)[src], left.to_numpy(dtype=object)[src])
+    if "Quantity" in df.columns:
+        out["Quantity"] = np.where(dbl, qty.to_numpy()[src] / 2.0, out["Quantity"].to_numpy())
+    out["pair_id"] = np.where(dbl, pair_id.to_numpy(dtype=object)[src], none)
+    out["pair_member"] = np.where(dbl, np.where(member_b, "B", "A").astype(object), none)
+    out["pair_color"] = np.where(dbl, pair_color, none)
+    if "Color Code" in df.columns:
+        out["Color Code"] = np.where(dbl, pair_color, out["Color Code"].to_numpy(dtype=object))
+    return out
 
 # ---------- Existing planning helpers ----------
-def calculate_hours(order, machines):
+def _spindle_kg_per_day(count, twist_factor, rotor_rpm):
+    """Working (90%) kg/day of one spindle; accepts scalars or NumPy arrays."""
+    tex = 583 / count
+    twist_tpm = twist_factor * 95 / np.sqrt(tex) * 10
+    take_up_speed = rotor_rpm / twist_tpm
+    spindle_prod_kg_h = take_up_speed * 60 * tex / 1_000_000
+    rotor_prod_day = spindle_prod_kg_h * 24
+    working_eff_per_spindle_day = rotor_prod_day * 0.9  # 90%
+    return working_eff_per_spindle_day
+
+def _line_spindles(line_name: str) -> int:
+    cfg = LINE_CONFIG[line_name]
+    return cfg["machines"] * cfg["spindles_per_machine"]
+
+CORE_ORDER_COLS = ["Yarn Count", "Composition", "Yarn Type", "Quantity"]
+
+def calculate_hours_batch(orders: pd.DataFrame, machine_index: dict,
+                          blend_auto_score: float = BLEND_FUZZY_AUTO_SCORE,
+                          count_index: Optional[dict] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
-    Returns (estimated_hours, error) based on LINE_CONFIG & machine table.
-    For 500-2000 kg we choose the faster of Lines 4–5; otherwise faster of Lines 1–3.
+    Estimated hours for every order from the machine index (see build_machine_index): for
+    500-2000 kg the faster of LINES_SMALL, otherwise the faster of LINES_MAIN, rounded up to 0.01 h.
+    Returns (df_matched, df_unmatched, blend_log); rows missing any of CORE_ORDER_COLS are skipped. Compositions missing from BLEND_MAPPING go
+    through fuzzy_match_blend; blend_log records what was auto-applied or only suggested.
+    With a count_index, counts missing from the catalogue are interpolated (throughput_source).
     """
-    try:
-        count = normalize_count(order["Yarn Count"])
-        blend_raw = str(order["Composition"]).strip()
-        yarn_type = str(order["Yarn Type"]).strip()
-        qty_required = float(order["Quantity"])
-
-        blend = normalize_blend(blend_raw)
-        if not blend:
-            return None, f"Blend not mapped: {blend_raw}"
-
-        matched = machines[
-            (machines["Counts"] == count) &
-            (machines["Blends"] == blend) &
-            (machines["Yarn Type"] == yarn_type)
-        ]
-
-        if matched.empty:
-            return None, "No machine data"
-
-        best_row = matched.loc[matched["twist factor"].idxmax()]
-        twist_factor = best_row["twist factor"]
-        rotor_rpm    = best_row["rotor rpm"]
-
-        tex = 583 / count
-        twist_tpm = twist_factor * 95 / math.sqrt(tex) * 10
-        take_up_speed = rotor_rpm / twist_tpm
-        spindle_prod_kg_h = take_up_speed * 60 * tex / 1_000_000
-        rotor_prod_day = spindle_prod_kg_h * 24
-        working_eff_per_spindle_day = rotor_prod_day * 0.9  # 90%
-
-        def line_kg_per_hour(line_name: str) -> float:
-            cfg = LINE_CONFIG[line_name]
-            total_spindles = cfg["machines"] * cfg["spindles_per_machine"]
-            kg_per_day_line = working_eff_per_spindle_day * total_spindles
-            return kg_per_day_line / 24.0
-
-        # pool selection
-        pool = LINES_SMALL if 500 <= qty_required <= 2000 else LINES_MAIN
-
-        speeds = {ln: line_kg_per_hour(ln) for ln in pool}
-        best_line = max(speeds, key=speeds.get)
-        kg_per_hour = speeds[best_line]
-        if kg_per_hour <= 0:
-            return None, "Calculated zero throughput"
-
-        hours = qty_required / kg_per_hour
-        return round_up(hours), None
-    except Exception as e:
-        return None, f"Error: {str(e)}"
-
-def get_next_best_color(current_color, available_colors, processed_colors):
-    if not current_color or current_color not in NEAREST_FAMILIES:
-        return available_colors[0] if available_colors else None
-    for nearest in NEAREST_FAMILIES.get(current_color, []):
-        if nearest in available_colors and nearest not in processed_colors:
-            return nearest
-    return available_colors[0] if available_colors else None
-
-def sequence_colors_smartly(badges_df):
+    matched_cols = ["order_id", "count", "blend", "yarn_type", "color_code", "color_family",
+                    "required_qty", "calculated_hours", "pair_id", "pair_member", "pair_color", "due_date",
+                    "throughput_source"]
+    unmatched_cols = [c for c in matched_cols if c not in ("calculated_hours", "due_date", "throughput_source")] + ["reason"]
+
+    if any(c not in orders.columns for c in CORE_ORDER_COLS):
+        return pd.DataFrame(columns=matched_cols), pd.DataFrame(columns=unmatched_cols), fuzzy_blend_decisions(pd.Series(dtype=object))
+    df = orders[orders[CORE_ORDER_COLS].notna().all(axis=1)]
+
+    def _opt(col):
+        return df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+    # per-unique-value normalization, mapped back to rows
+    count_map = {v: normalize_count(v) for v in pd.unique(df["Yarn Count"])}
+    counts = df["Yarn Count"].map(count_map)
+    blend_raw = df["Composition"].astype(str).str.strip()
+    blends = _map_unique(blend_raw, normalize_blend)
+    blend_log = fuzzy_blend_decisions(blend_raw[blends.isna()], blend_auto_score)
+    applied = blend_log[blend_log["decision"] == "auto-applied"]
+    if not applied.empty:
+        blends = blends.where(blends.notna(), blend_raw.map(dict(zip(applied["composition"], applied["blend"]))))
+    yarn_types = df["Yarn Type"].astype(str).str.strip()
+    qty = pd.to_numeric(df["Quantity"], errors="coerce").to_numpy(dtype=float)
+
+    # one index probe per order -> kg/hour on every line
+    nan_row = (np.nan,) * len(LINES)
+    line_kg_per_hour = np.array(
+        [machine_index.get((c, b, y), nan_row) for c, b, y in zip(counts, blends, yarn_types)],
+        dtype=float,
+    ).reshape(len(df), len(LINES))
+    has_machine = ~np.isnan(line_kg_per_hour).all(axis=1)
+
+    # counts the catalogue lacks: estimate from the neighbouring counts of the same blend / yarn type
+    interpolated = np.zeros(len(df), dtype=bool)
+    if count_index is not None:
+        miss = np.flatnonzero(~has_machine & blends.notna().to_numpy() & counts.notna().to_numpy())
+        keys = list(zip(counts.to_numpy()[miss], blends.to_numpy()[miss], yarn_types.to_numpy()[miss]))
+        estimates = {k: interpolate_line_speeds(*k, count_index) for k in set(keys)}
+        for row, k in zip(miss, keys):
+            if estimates[k] is not None:
+                line_kg_per_hour[row] = estimates[k]
+                interpolated[row] = True
+        has_machine |= interpolated
+
+    # pool selection: fastest line of LINES_SMALL for 500–2000 kg, else of LINES_MAIN
+    small_pool = (qty >= 500) & (qty <= 2000)
+    small_idx = [LINES.index(ln) for ln in LINES_SMALL]
+    main_idx = [LINES.index(ln) for ln in LINES_MAIN]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kg_per_hour = np.where(
+            small_pool,
+            np.max(line_kg_per_hour[:, small_idx], axis=1, initial=-np.inf),
+            np.max(line_kg_per_hour[:, main_idx], axis=1, initial=-np.inf),
+        )
+        hours = np.ceil(qty / kg_per_hour * 100) / 100  # rounded up to 0.01 h
+
+    blend_ok = blends.notna().to_numpy() & (blends.astype(str).to_numpy() != "")
+    reason = np.full(len(df), None, dtype=object)
+    suggested = blend_log[blend_log["decision"] == "suggested"]
+    hint = blend_raw.map({c: f" (closest: {e}, score {sc:.2f})"
+                          for c, e, sc in zip(suggested["composition"], suggested["matched_entry"], suggested["score"])})
+    reason[~blend_ok] = ("Blend not mapped: " + blend_raw[~blend_ok] + hint[~blend_ok].fillna("").astype(str)).to_numpy()
+    reason[blend_ok & ~has_machine] = "No machine data"
+    bad_speed = blend_ok & has_machine & ~(np.isfinite(kg_per_hour) & (kg_per_hour > 0))
+    reason[bad_speed] = "Calculated zero throughput"
+    ok = blend_ok & has_machine & ~bad_speed
+
+    out = pd.DataFrame({
+        "order_id": _opt("PI NO"),
+        "count": counts.astype(object).where(counts.notna(), None),
+        "blend": df["Composition"],
+        "yarn_type": df["Yarn Type"],
+        "color_code": _opt("Color Code"),
+        "color_family": _opt("ColorFamilyName"),
+        "required_qty": df["Quantity"],
+        "calculated_hours": hours,
+        "pair_id": _opt("pair_id"),
+        "pair_member": _opt("pair_member"),
+        "pair_color": _opt("pair_color"),
+        "due_date": pd.to_datetime(_opt("Due Date"), errors="coerce"),
+        "throughput_source": np.where(interpolated, "interpolated", "exact"),
+        "reason": reason,
+    })
+    df_matched = out[ok][matched_cols].reset_index(drop=True)
+    df_unmatched = out[~ok][unmatched_cols].reset_index(drop=True)
+    return df_matched, df_unmatched, blend_log
+
+def build_changeover_costs(families: dict = None, overrides: dict = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Numeric changeover cost between colour families (title-cased, as in color_family_norm).
+    A direct NEAREST_FAMILIES neighbour costs 1 plus 0.1 per place down its list; other pairs
+    cost the cheapest chain of neighbours. CHANGEOVER_COST_OVERRIDES pins individual pairs.
+    Returns (family_names, cost_matrix).
+    """
+    families = NEAREST_FAMILIES if families is None else families
+    overrides = CHANGEOVER_COST_OVERRIDES if overrides is None else overrides
+    names = sorted({str(f).strip().title() for f in families}
+                   | {str(n).strip().title() for ns in families.values() for n in ns})
+    pos = {n: i for i, n in enumerate(names)}
+    cost = np.full((len(names), len(names)), np.inf)
+    np.fill_diagonal(cost, 0.0)
+    for fam, neighbours in families.items():
+        i = pos[str(fam).strip().title()]
+        for rank, nb in enumerate(neighbours):
+            j = pos[str(nb).strip().title()]
+            c = 1.0 + 0.1 * rank
+            cost[i, j] = cost[j, i] = min(cost[i, j], c)
+    for (f1, f2), c in overrides.items():
+        i, j = pos.get(str(f1).strip().title()), pos.get(str(f2).strip().title())
+        if i is not None and j is not None:
+            cost[i, j] = cost[j, i] = float(c)
+    for k in range(len(names)):  # Floyd–Warshall
+        cost = np.minimum(cost, cost[:, k:k + 1] + cost[k:k + 1, :])
+    finite = cost[np.isfinite(cost)]
+    cost[~np.isfinite(cost)] = (finite.max() if finite.size else 0.0) + 1.0
+    return names, cost
+
+CHANGEOVER_FAMILIES, CHANGEOVER_COST = build_changeover_costs()
+_CHANGEOVER_POS = {n: i for i, n in enumerate(CHANGEOVER_FAMILIES)}
+UNKNOWN_CHANGEOVER_COST = float(CHANGEOVER_COST.max()) + 1.0
+
+def changeover_cost_matrix(colors: List[str]) -> np.ndarray:
+    """Pairwise changeover costs for `colors`; families outside the table cost UNKNOWN_CHANGEOVER_COST."""
+    idx = np.array([_CHANGEOVER_POS.get(str(c).strip().title(), -1) for c in colors], dtype=int)
+    known = idx >= 0
+    m = np.full((len(colors), len(colors)), UNKNOWN_CHANGEOVER_COST)
+    m[np.ix_(known, known)] = CHANGEOVER_COST[np.ix_(idx[known], idx[known])]
+    np.fill_diagonal(m, 0.0)
+    return m
+
+def sequence_color_families(colors: List[str], start: str) -> List[str]:
+    """
+    Order colour families as a cheap changeover path starting at `start`:
+    nearest-neighbour construction, then 2-opt segment reversals until no move improves it.
+    """
+    cost = changeover_cost_matrix(colors)
+    n = len(colors)
+    first = colors.index(start)
+    path = [first]
+    left = [i for i in range(n) if i != first]
+    while left:
+        nxt = min(left, key=lambda j: cost[path[-1], j])
+        path.append(nxt)
+        left.remove(nxt)
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                a, b, c = path[i - 1], path[i], path[j]
+                d = path[j + 1] if j + 1 < n else None
+                before = cost[a, b] + (cost[c, d] if d is not None else 0.0)
+                after = cost[a, c] + (cost[b, d] if d is not None else 0.0)
+                if after < before - 1e-9:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    improved = True
+    return [colors[i] for i in path]
+
+def sequence_colors_smartly(badges_df, start_color: Optional[str] = None):
     unique_colors = badges_df["color_family_norm"].unique().tolist()
     if len(unique_colors) <= 1:
-        return badges_df
-    color_priority = badges_df.groupby("color_family_norm")["_due_sort"].min().sort_values()
-    current_color = color_priority.index[0]
-    color_sequence = [current_color]
-    remaining_colors = [c for c in unique_colors if c != current_color]
-    while remaining_colors:
-        next_color = get_next_best_color(current_color, remaining_colors, color_sequence)
-        if next_color:
-            color_sequence.append(next_color)
-            remaining_colors.remove(next_color)
-            current_color = next_color
-        else:
-            color_sequence.append(remaining_colors[0])
-            current_color = remaining_colors[0]
-            remaining_colors.pop(0)
+        return badges_df.sort_values(by=["_due_sort", "required_qty"], ascending=[True, False])
+    if start_color not in unique_colors:
+        color_priority = badges_df.groupby("color_family_norm")["_due_sort"].min().sort_values()
+        start_color = color_priority.index[0]
+    color_sequence = sequence_color_families(unique_colors, start_color)
     badges_df["color_order"] = badges_df["color_family_norm"].map(
         {color: idx for idx, color in enumerate(color_sequence)}
     )
@@ -472,31 +705,293 @@ def sequence_colors_smartly(badges_df):
         ascending=[True, True, False]
     ).drop(columns=["color_order"])
 
+def sequence_due_windows(badges_df, window_days: int = DUE_WINDOW_DAYS):
+    """
+    Earliest-due-date first, colour-clustered inside each window: badges are bucketed into
+    `window_days` windows of earliest_due (undated badges last) and each bucket is colour-sequenced,
+    starting from the colour the previous bucket ended on.
+    """
+    if badges_df.empty:
+        return badges_df
+    due = badges_df["earliest_due"]
+    if due.notna().any():
+        window = (due - due.min()).dt.days // max(1, int(window_days))
+        window = window.fillna(window.max() + 1).astype(int)
+    else:
+        window = pd.Series(0, index=badges_df.index)
+
+    parts, last_color = [], None
+    for _, part in badges_df.assign(_due_window=window).groupby("_due_window", sort=True):
+        part = sequence_colors_smartly(part.copy(), start_color=last_color)
+        last_color = part["color_family_norm"].iloc[-1]
+        parts.append(part)
+    return pd.concat(parts).drop(columns=["_due_window"])
+
+def sequence_badges(badges_df, mode: str = "color"):
+    """Order badges for scheduling; mode is one of SEQUENCING_MODES' values."""
+    if mode == "due-window":
+        return sequence_due_windows(badges_df)
+    return sequence_colors_smartly(badges_df)
+
+# ========================================
+# MACHINE CATALOGUE (cached columnar copy of MACHINE_FILE_PATH)
+# ========================================
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _line_config_key() -> str:
+    return hashlib.sha256(json.dumps(LINE_CONFIG, sort_keys=True).encode()).hexdigest()
+
+def _machine_cache_path(path: str, suffix: str = ".npz") -> str:
+    base = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(MACHINE_CACHE_DIR, f"{base}{suffix}")
+
+def _read_machine_cache(cache_path: str) -> Optional[dict]:
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as z:
+            data = {k: z[k] for k in z.files}
+    except Exception:
+        return None
+    if int(data.get("_version", -1)) != MACHINE_CACHE_VERSION:
+        return None
+    return data
+
+def _frame_to_arrays(df: pd.DataFrame, prefix: str = "") -> dict:
+    arrays = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_numeric_dtype(s):
+            arrays[prefix + col] = s.to_numpy()
+        else:
+            arrays[prefix + col] = s.fillna("").astype(str).to_numpy(dtype=str)
+    return arrays
+
+def _arrays_to_frame(data: dict, prefix: str = "") -> pd.DataFrame:
+    cols = [k[len(prefix):] for k in data if k.startswith(prefix) and not k.startswith("_")]
+    return pd.DataFrame({c: data[prefix + c] for c in cols})
+
+def _write_machine_cache(cache_path: str, machines: pd.DataFrame, throughput: pd.DataFrame, mtime: float, sha: str):
+    arrays = _frame_to_arrays(machines[MACHINE_CACHE_COLUMNS], "m__")
+    arrays.update(_frame_to_arrays(throughput, "tp__"))
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path, _version=MACHINE_CACHE_VERSION, _mtime=mtime, _sha256=sha,
+            _line_config=_line_config_key(), **arrays
+        )
+        os.replace(tmp_path, cache_path)
+        # human-readable copy of the throughput table for inspection/export
+        throughput.to_csv(cache_path[:-len(".npz")] + "_throughput.csv", index=False)
+    except OSError:
+        # read-only deployment: keep working without the cache
+        pass
+
+def build_throughput_table(machines: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per (Counts, Blends, Yarn Type): the machine row with the highest twist factor
+    plus its working kg/hour on every line in LINE_CONFIG (one column per line).
+    """
+    keys = ["Counts", "Blends", "Yarn Type"]
+    best_idx = machines.dropna(subset=["twist factor"]).groupby(keys)["twist factor"].idxmax()
+    table = machines.loc[best_idx.values, keys + ["twist factor", "rotor rpm"]].reset_index(drop=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_spindle_day = _spindle_kg_per_day(
+            table["Counts"].to_numpy(dtype=float),
+            table["twist factor"].to_numpy(dtype=float),
+            table["rotor rpm"].to_numpy(dtype=float),
+        )
+        for ln in LINES:
+            table[ln] = per_spindle_day * _line_spindles(ln) / 24.0
+    return table
+
+def load_machine_catalogue(path: str = MACHINE_FILE_PATH) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Return (machines, throughput): the machine table with only the columns the planner uses
+    and its per-line throughput table (see build_throughput_table).
+    The workbook is parsed once and kept as a .npz under MACHINE_CACHE_DIR, keyed by the
+    workbook's mtime and sha256; a touched-but-unchanged workbook only costs a hash, and a
+    LINE_CONFIG change only recomputes the throughput table.
+    """
+    mtime = os.path.getmtime(path)  # raises FileNotFoundError like read_excel did
+    cache_path = _machine_cache_path(path)
+    cached = _read_machine_cache(cache_path)
+
+    sha = None
+    rewrite = False
+    if cached is not None and float(cached["_mtime"]) != mtime:
+        sha = _file_sha256(path)
+        if str(cached["_sha256"]) != sha:
+            cached = None
+        else:
+            rewrite = True
+
+    if cached is not None:
+        machines = _arrays_to_frame(cached, "m__")
+        if str(cached["_line_config"]) == _line_config_key():
+            throughput = _arrays_to_frame(cached, "tp__")
+        else:
+            throughput = build_throughput_table(machines)
+            rewrite = True
+        if rewrite:
+            _write_machine_cache(cache_path, machines, throughput, mtime, sha or str(cached["_sha256"]))
+        return machines, throughput
+
+    machines = read_excel(path, usecols=MACHINE_CACHE_COLUMNS)
+    throughput = build_throughput_table(machines)
+    _write_machine_cache(cache_path, machines, throughput, mtime, sha or _file_sha256(path))
+    return machines, throughput
+
+def export_throughput_table(out_path: str, path: str = MACHINE_FILE_PATH) -> pd.DataFrame:
+    """Write the throughput table for `path` to .csv or .xlsx (by extension) and return it."""
+    _, throughput = load_machine_catalogue(path)
+    if out_path.lower().endswith((".xlsx", ".xls")):
+        throughput.to_excel(out_path, index=False)
+    else:
+        throughput.to_csv(out_path, index=False)
+    return throughput
+
+def build_machine_index(throughput: pd.DataFrame) -> dict:
+    """
+    Map (count, blend, yarn_type) -> tuple of kg/hour per line (aligned with LINES),
+    taken from the throughput table.
+    """
+    keys = ["Counts", "Blends", "Yarn Type"]
+    rows = throughput[keys + LINES].itertuples(index=False, name=None)
+    return {(int(r[0]), r[1], r[2]): tuple(float(v) for v in r[3:]) for r in rows}
+
+def build_count_index(throughput: pd.DataFrame) -> dict:
+    """Map (blend, yarn_type) -> (sorted counts, twist factors, rotor rpms) from the throughput table."""
+    index = {}
+    ordered = throughput.sort_values("Counts", kind="stable")
+    for key, g in ordered.groupby(["Blends", "Yarn Type"], sort=False):
+        index[key] = (g["Counts"].to_numpy(dtype=float),
+                      g["twist factor"].to_numpy(dtype=float),
+                      g["rotor rpm"].to_numpy(dtype=float))
+    return index
+
+def interpolate_line_speeds(count, blend, yarn_type, count_index: dict) -> Optional[tuple]:
+    """
+    kg/hour per line (aligned with LINES) for a count the catalogue lacks: twist factor and rotor rpm
+    are interpolated between the neighbouring catalogued counts (binary search), then run through
+    _spindle_kg_per_day. None outside the catalogued range or across a gap wider than COUNT_INTERPOLATION_MAX_GAP.
+    """
+    entry = count_index.get((blend, yarn_type))
+    if entry is None:
+        return None
+    counts, twist, rpm = entry
+    i = int(np.searchsorted(counts, count))
+    if i == 0 or i >= len(counts) or counts[i] - counts[i - 1] > COUNT_INTERPOLATION_MAX_GAP:
+        return None
+    w = (count - counts[i - 1]) / (counts[i] - counts[i - 1])
+    per_spindle_day = _spindle_kg_per_day(
+        float(count),
+        twist[i - 1] + w * (twist[i] - twist[i - 1]),
+        rpm[i - 1] + w * (rpm[i] - rpm[i - 1]),
+    )
+    return tuple(float(per_spindle_day * _line_spindles(ln) / 24.0) for ln in LINES)
+
 # ========================================
 # ROBUST ORDER LOADER (handles Proforma sheet)
 # ========================================
-def load_customer_orders(customer_file) -> (pd.DataFrame, str):
+def _order_file_kind(customer_file) -> str:
+    name = str(getattr(customer_file, "name", customer_file)).lower()
+    ext = os.path.splitext(name)[1].lstrip(".")
+    return {"csv": "csv", "txt": "csv", "parquet": "parquet", "pq": "parquet"}.get(ext, "excel")
+
+def _read_excel_orders(customer_file) -> (pd.DataFrame, str):
     try:
-        xls = pd.ExcelFile(customer_file)
+        xls = open_excel(customer_file)
     except Exception as e:
         return None, f"Error opening Excel file: {e}"
 
-    selected_df, best_hit = None, -1
+    # Sniff only the top rows of every sheet to pick the order table; parse just that sheet fully
+    best_sheet, best_hit = None, -1
     for sheet in xls.sheet_names:
         try:
-            raw = pd.read_excel(customer_file, sheet_name=sheet, header=None)
-            hdr_row = _detect_header_row(raw)
-            df = pd.read_excel(customer_file, sheet_name=sheet, header=hdr_row)
-            df = df.dropna(how="all")
-            df = _standardize_columns(df)
-            hit = sum(1 for c in REQUIRED_STD_COLS if c in df.columns)
+            top = parse_sheet(xls, sheet, header=None, nrows=HEADER_SNIFF_ROWS)
+            if top.empty:
+                hit = 0
+            else:
+                hit = _required_hits(top.iloc[_detect_header_row(top)].tolist())
             if hit > best_hit:
                 best_hit = hit
-                selected_df = df
+                best_sheet = sheet
         except Exception:
             continue
 
-    if selected_df is None or best_hit < 3:
+    if best_sheet is None or best_hit < 3:
+        return None, None
+    try:
+        raw = parse_sheet(xls, best_sheet, header=None)
+        df = _frame_from_header_row(raw, _detect_header_row(raw))
+        return _standardize_columns(df.dropna(how="all")), None
+    except Exception:
+        return None, None
+
+def _sniff_csv_rows(customer_file, encoding: str) -> pd.DataFrame:
+    """First HEADER_SNIFF_ROWS physical lines as a ragged frame, for header detection (preamble rows may be short)."""
+    if hasattr(customer_file, "read"):
+        customer_file.seek(0)
+        lines = [customer_file.readline() for _ in range(HEADER_SNIFF_ROWS)]
+        customer_file.seek(0)
+        lines = [l.decode(encoding) if isinstance(l, bytes) else l for l in lines]
+    else:
+        with open(customer_file, encoding=encoding, newline="") as fh:
+            lines = [fh.readline() for _ in range(HEADER_SNIFF_ROWS)]
+    return pd.DataFrame(list(csv.reader(l for l in lines if l)))
+
+def _read_csv_chunked(customer_file, encoding: str) -> Optional[pd.DataFrame]:
+    """
+    Stream the export, parsing only columns that map to a COLUMN_ALIASES name (remarks, addresses, ...
+    are skipped by the parser). Chunks are dropped as soon as they are concatenated; string data is
+    shared with the result, so only the per-column arrays briefly exist twice.
+    """
+    hdr_row = _detect_header_row(_sniff_csv_rows(customer_file, encoding))
+    chunks = [chunk.dropna(how="all") for chunk in pd.read_csv(
+        customer_file, skiprows=hdr_row, chunksize=CSV_CHUNK_ROWS,
+        usecols=lambda c: _alias_to_std(str(c)) in COLUMN_ALIASES,
+        encoding=encoding, skip_blank_lines=False)]
+    if not chunks:
+        return None
+    df = pd.concat(chunks, ignore_index=True)
+    del chunks
+    return _standardize_columns(df)
+
+def _read_csv_orders(customer_file) -> (pd.DataFrame, str):
+    for encoding in CSV_ENCODINGS:
+        try:
+            return _read_csv_chunked(customer_file, encoding), None
+        except UnicodeDecodeError:
+            if hasattr(customer_file, "seek"):
+                customer_file.seek(0)
+        except Exception as e:
+            return None, f"Error reading CSV file: {e}"
+    return None, "Error reading CSV file: unknown text encoding"
+
+def _read_parquet_orders(customer_file) -> (pd.DataFrame, str):
+    try:
+        df = pd.read_parquet(customer_file)
+    except ImportError:
+        return None, "Reading Parquet files requires pyarrow (pip install pyarrow)."
+    except Exception as e:
+        return None, f"Error reading Parquet file: {e}"
+    return _standardize_columns(df.dropna(how="all").reset_index(drop=True)), None
+
+ORDER_READERS = {"excel": _read_excel_orders, "csv": _read_csv_orders, "parquet": _read_parquet_orders}
+
+def load_customer_orders(customer_file) -> (pd.DataFrame, str):
+    selected_df, err = ORDER_READERS[_order_file_kind(customer_file)](customer_file)
+    if err:
+        return None, err
+
+    if selected_df is None or sum(1 for c in REQUIRED_STD_COLS if c in selected_df.columns) < 3:
         return None, "Could not detect a valid data table with required columns."
 
     if "ColorFamilyName" not in selected_df.columns and "Color" in selected_df.columns:
@@ -508,7 +1003,7 @@ def load_customer_orders(customer_file) -> (pd.DataFrame, str):
         return None, "Missing Quantity column after normalization."
 
     if "Composition" in selected_df.columns:
-        selected_df["Composition"] = selected_df["Composition"].apply(_clean_text)
+        selected_df["Composition"] = _map_unique(selected_df["Composition"], _clean_text)
 
     if "Due Date" in selected_df.columns:
         selected_df["Due Date"] = selected_df["Due Date"].apply(ensure_date)
@@ -516,118 +1011,138 @@ def load_customer_orders(customer_file) -> (pd.DataFrame, str):
     return selected_df, None
 
 # ========================================
-# MAIN PROCESSING FUNCTION
+# SCHEDULERS
 # ========================================
-@st.cache_data
-def process_orders_and_generate_plan(customer_file):
-    """Returns (results_dict, not_matched_df, error_msg_or_none)"""
-    try:
-        machines = pd.read_excel(MACHINE_FILE_PATH)
-    except FileNotFoundError:
-        return None, None, "Machine configuration file not found at ./reports/machine.xlsx"
-    except Exception as e:
-        return None, None, f"Error loading machine file: {str(e)}"
-
-    orders, load_err = load_customer_orders(customer_file)
-    if load_err:
-        return None, None, load_err
-
-    # ---- NEW: explode double yarn into pair members ----
-    orders = explode_double_yarn(orders)
-
-    # ── Split "Sample" single orders (0 < qty ≤ 200 kg) BEFORE matching/scheduling
-    samples_df = orders[(orders["Quantity"] > 0) & (orders["Quantity"] <= 200)].copy()
-    plan_orders = orders[~orders.index.isin(samples_df.index)].copy()
-
-    matched_results, unmatched_results = [], []
-
-    for _, order in plan_orders.iterrows():
-        # guard: skip rows without core fields
-        if any(col not in order or pd.isna(order[col]) for col in ["Yarn Count", "Composition", "Yarn Type", "Quantity"]):
-            continue
-
-        normalized_count = normalize_count(order["Yarn Count"])
-        hours, error = calculate_hours(order, machines)
-
-        if error:
-            unmatched_results.append({
-                "order_id": order.get("PI NO"),
-                "count": normalized_count,
-                "blend": order.get("Composition"),
-                "yarn_type": order.get("Yarn Type"),
-                "color_code": order.get("Color Code"),
-                "color_family": order.get("ColorFamilyName"),
-                "required_qty": order.get("Quantity", 0.0),
-                "pair_id": order.get("pair_id"),
-                "pair_member": order.get("pair_member"),
-                "pair_color": order.get("pair_color"),
-                "reason": error
-            })
-        else:
-            matched_results.append({
-                "order_id": order.get("PI NO"),
-                "count": normalized_count,
-                "blend": order.get("Composition"),
-                "yarn_type": order.get("Yarn Type"),
-                "color_code": order.get("Color Code"),
-                "color_family": order.get("ColorFamilyName"),
-                "required_qty": order.get("Quantity", 0.0),
-                "calculated_hours": hours,
-                "pair_id": order.get("pair_id"),
-                "pair_member": order.get("pair_member"),
-                "pair_color": order.get("pair_color")
-            })
-
-    df_matched = pd.DataFrame(matched_results)
-    df_unmatched = pd.DataFrame(unmatched_results)
-
-    # If there is nothing to schedule (except samples), still return usable payload
-    if df_matched.empty:
-        empty_results = {
-            "production_plan": pd.DataFrame(),
-            "batch_status": pd.DataFrame(),
-            "line_utilization": pd.DataFrame(),
-            "color_changeover": pd.DataFrame(),
-            "line_color_summary": pd.DataFrame(),
-            "multiply_pair_warnings": pd.DataFrame(),
-            "not_matched": df_unmatched,
-            "total_pi": int(plan_orders["PI NO"].nunique()) if "PI NO" in plan_orders.columns else len(plan_orders),
-            "samples": samples_df.reset_index(drop=True)
-        }
-        return empty_results, df_unmatched, None
-
-    # Build batches ("badges")
-    badges = (
-        df_matched
-        .groupby(["count", "yarn_type", "blend", "color_code", "color_family"], as_index=False)
-        .agg({
-            "order_id": lambda x: ", ".join(x.astype(str)),
-            "required_qty": "sum",
-            "calculated_hours": "sum",
-            "pair_id": lambda s: ",".join(sorted({str(x) for x in s if pd.notna(x)})) or None,
-            "pair_member": lambda s: ",".join(sorted({str(x) for x in s if pd.notna(x)})) or None,
-        })
-    )
-
-    badges["batch_id"] = badges.apply(
-        lambda row: f"{int(row['count'])}-{str(row.get('blend') or '').split()[0]}-{str(row.get('color_code') or '')}".replace(' ', '_'),
-        axis=1
-    )
-
-    badges["color_family_norm"] = badges["color_family"].fillna("Unknown").astype(str).str.strip().str.title()
-    badges["_due_sort"] = datetime.max.date()
-    badges["earliest_due"] = None
-    badges = sequence_colors_smartly(badges)
-
-    plan_start = datetime.now().date()
-    horizon_end = plan_start + timedelta(days=HORIZON_DAYS)
-
+def badge_line_pools(total_required: float, all_small: bool) -> Tuple[List[str], List[str]]:
+    """
+    Returns (target_pool, overflow_lines) for a badge.
+    200–2000 kg badges go to LINES_SMALL and may overflow to the main lines; bigger ones use
+    LINES_MAIN. If every badge in the plan is small, all lines form one pool.
+    """
+    if all_small:
+        return LINES, []
+    if 200 <= total_required <= 2000:
+        return LINES_SMALL, [l for l in LINES_MAIN if l not in LINES_SMALL]  # big lines
+    return LINES_MAIN, []
+
+def _single_pair(pair_id) -> Optional[str]:
+    pair_ids = []
+    if pd.notna(pair_id) and pair_id:
+        pair_ids = [p for p in str(pair_id).split(",") if p and p != "None"]
+    return pair_ids[0] if len(pair_ids) == 1 else None
+
+def single_pair_id(badge) -> Optional[str]:
+    """The badge's pair_id when it holds exactly one double-yarn pair (typical for halves), else None."""
+    return _single_pair(badge.get("pair_id"))
+
+def all_badges_small(badges: pd.DataFrame) -> bool:
+    return bool(len(badges) > 0 and (badges["required_qty"].between(200, 2000, inclusive="both").all()))
+
+# ---------- NEW: Columnar allocation log ----------
+# One entry per allocated slice, kept as typed append-only arrays. Badge strings (orders, blend,
+# colour, ...) are not copied per slice: the log holds the badge's position in `badges` and
+# alloc_log_frame joins them back once. Times are minutes since 00:00 of the plan start day
+# (the schedulers' time model) and only become timestamps in minutes_to_datetimes.
+# kg a scheduler could not place in the horizon is logged per badge (unplaced_*).
+ALLOC_LOG_COLUMNS = {"badge": "l", "line": "b", "day": "l", "shift": "b",
+                     "allocated_kg": "d", "start_min": "d", "end_min": "d",
+                     "unplaced_badge": "l", "unplaced_kg": "d"}
+
+def minutes_to_datetimes(plan_start, minutes) -> pd.DatetimeIndex:
+    """Minutes since 00:00 of plan_start as datetime64 timestamps, rounded to the microsecond."""
+    us = np.round(np.asarray(minutes, dtype=float) * 60_000_000).astype(np.int64)
+    return pd.Timestamp(plan_start).normalize() + pd.to_timedelta(us, unit="us")
+
+def new_alloc_log() -> dict:
+    return {col: array(code) for col, code in ALLOC_LOG_COLUMNS.items()}
+
+def log_slice(log: dict, badge_pos: int, line_idx: int, day: int, shift_idx: int,
+              kg: float, start_min: float, end_min: float):
+    log["badge"].append(badge_pos)
+    log["line"].append(line_idx)
+    log["day"].append(day)
+    log["shift"].append(shift_idx)
+    log["allocated_kg"].append(kg)
+    log["start_min"].append(start_min)
+    log["end_min"].append(end_min)
+
+def log_unplaced(log: dict, badge_pos: int, kg: float):
+    log["unplaced_badge"].append(badge_pos)
+    log["unplaced_kg"].append(kg)
+
+def unplaced_frame(log: dict, badges: pd.DataFrame) -> pd.DataFrame:
+    """Badges with kg left unplaced, as exception rows in the not_matched layout (plus batch_id)."""
+    if not len(log["unplaced_badge"]):
+        return pd.DataFrame()
+    rows = badges.iloc[np.asarray(log["unplaced_badge"], dtype=np.int64)].reset_index(drop=True)
+    kg = np.asarray(log["unplaced_kg"], dtype=float)
+    reason = [f"Not scheduled within the {HORIZON_DAYS}-day horizon ({left:,.0f} of {total:,.0f} kg unplaced)"
+              for left, total in zip(kg, rows["required_qty"].astype(float))]
+    return pd.DataFrame({
+        "order_id": rows["order_id"],
+        "count": rows["count"],
+        "blend": rows["blend"],
+        "yarn_type": rows["yarn_type"],
+        "color_code": rows.get("color_code"),
+        "color_family": rows["color_family"],
+        "required_qty": np.round(kg, 2),
+        "pair_id": rows.get("pair_id"),
+        "pair_member": rows.get("pair_member"),
+        "pair_color": None,
+        "reason": reason,
+        "batch_id": rows["batch_id"],
+    })
+
+def alloc_log_frame(log: dict, badges: pd.DataFrame, plan_start) -> pd.DataFrame:
+    """The production plan (one row per slice) from an allocation log over `badges`."""
+    if not len(log["badge"]):
+        return pd.DataFrame()
+    pos = np.asarray(log["badge"], dtype=np.int64)
+
+    def badge_col(col):
+        if col not in badges.columns:
+            return np.full(len(pos), None, dtype=object)
+        return badges[col].to_numpy()[pos]
+
+    pair_ids = (_map_unique(badges["pair_id"], _single_pair).to_numpy()[pos]
+                if "pair_id" in badges.columns else badge_col("pair_id"))
+    return pd.DataFrame({
+        "batch_id": badge_col("batch_id"),
+        "orders": badge_col("order_id"),
+        "line": np.asarray(LINES, dtype=object)[np.asarray(log["line"], dtype=np.int64)],
+        "date": pd.Timestamp(plan_start).normalize() + pd.to_timedelta(np.asarray(log["day"], dtype=np.int64), unit="D"),
+        "shift": np.array([s[0] for s in SHIFTS], dtype=object)[np.asarray(log["shift"], dtype=np.int64)],
+        "allocated_kg": np.asarray(log["allocated_kg"], dtype=float),
+        "start_dt": minutes_to_datetimes(plan_start, log["start_min"]),
+        "end_dt": minutes_to_datetimes(plan_start, log["end_min"]),
+        "color_code": badge_col("color_code"),
+        "color_family": badge_col("color_family_norm"),
+        "count": badge_col("count"),
+        "blend": badge_col("blend"),
+        "yarn_type": badge_col("yarn_type"),
+        "pair_id": pair_ids,
+        "pair_member": badge_col("pair_member"),
+    })
+
+def schedule_greedy(badges: pd.DataFrame, plan_start) -> Tuple[dict, pd.DataFrame]:
+    """
+    Shift-filling scheduler: walks badges in sequence order and packs each into the earliest
+    free shift capacity of its pool. All times are minutes since plan start.
+    Returns (alloc_log, multiply_pair_warnings).
+    """
     # Are ALL planned batches small (200–2000)?
-    all_small = bool(len(badges) > 0 and (badges["required_qty"].between(200, 2000, inclusive="both").all()))
-
-    # capacity[(date, line, shift_idx)] = remaining_kg for that slot
-    capacity = {}
-    slot_used = {}
+    all_small = all_badges_small(badges)
+
+    # Capacity calendar indexed [day, line, shift] over plan_start .. plan_start + HORIZON_DAYS (inclusive)
+    n_days = HORIZON_DAYS + 1
+    line_pos = {ln: i for i, ln in enumerate(LINES)}
+    shift_cap = np.array([PER_SHIFT_CAPACITY[ln] for ln in LINES], dtype=float)
+    remaining_kg = np.repeat(shift_cap[None, :, None], n_days, axis=0).repeat(len(SHIFTS), axis=2)
+    used_kg = np.zeros_like(remaining_kg)
+    # first_free[line] = first flat slot (day * len(SHIFTS) + shift) that still has capacity;
+    # capacity is only ever consumed, so these pointers only move forward
+    n_slots = n_days * len(SHIFTS)
+    first_free = np.zeros(len(LINES), dtype=int)
 
     # separate color→line maps for main vs small pools to preserve color stability
     color_line_map_main  = {}
@@ -643,43 +1158,104 @@ def process_orders_and_generate_plan(customer_file):
         return ln
 
     # ---------- NEW: Reservation state for pairs ----------
-    # pair_finish_window[pair_id] = {"first_end": dt, "deadline": dt+24h}
+    # pair_finish_window[pair_id] = {"first_end": min, "deadline": min + PAIR_WINDOW_MIN}
     pair_finish_window = {}
     multiply_pair_warnings = []
+    # batch_last_end[batch_id] = latest end minute committed so far for that batch id
+    batch_last_end = {}
 
-    def within_pair_window(pid: str, proposed_end: datetime) -> bool:
+    def within_pair_window(pid: str, proposed_end: float) -> bool:
         w = pair_finish_window.get(pid)
         if not w:
             return True  # First member; no window yet
         return proposed_end <= w["deadline"]
 
-    alloc_rows = []
-
-    for _, badge in badges.iterrows():
+    alloc_log = new_alloc_log()
+
+    def slice_minutes(day: int, shift_idx: int, per_shift_cap: float, used_before: float, used: float):
+        start_min = day * 1440 + SHIFTS[shift_idx][1] + (used_before / per_shift_cap) * SHIFT_DURATION_MIN
+        return start_min, start_min + (used / per_shift_cap) * SHIFT_DURATION_MIN
+
+    def slot_is_full(li: int, flat: int) -> bool:
+        d, si = divmod(flat, len(SHIFTS))
+        return remaining_kg[d, li, si] <= 1e-9 or shift_cap[li] - used_kg[d, li, si] <= 1e-9
+
+    def advance_first_free(li: int):
+        f = first_free[li]
+        while f < n_slots and slot_is_full(li, f):
+            f += 1
+        first_free[li] = f
+
+    def next_free_day(lines) -> int:
+        return int(min(first_free[line_pos[l]] for l in lines)) // len(SHIFTS)
+
+    def fill_line_day(badge_pos: int, badge, line: str, day: int, remaining: float, pair_id: Optional[str]) -> float:
+        """Allocate `remaining` kg into the free shifts of `line` on `day`; returns what is left."""
+        li = line_pos[line]
+        first_shift = first_free[li] - day * len(SHIFTS)
+        if first_shift >= len(SHIFTS):
+            return remaining  # whole day already full on this line
+        per_shift_cap = PER_SHIFT_CAPACITY[line]
+        for shift_idx in range(max(0, first_shift), len(SHIFTS)):
+            if remaining <= 1e-6:
+                break
+
+            avail = float(remaining_kg[day, li, shift_idx])
+            if avail <= 1e-9:
+                continue
+
+            # allocate as much as possible in this shift
+            used_before = float(used_kg[day, li, shift_idx])
+            free_now = max(0.0, per_shift_cap - used_before)
+            if free_now <= 1e-9:
+                continue
+
+            used = min(avail, remaining, free_now)
+            if used <= 1e-9:
+                continue
+
+            start_min, end_min = slice_minutes(day, shift_idx, per_shift_cap, used_before, used)
+
+            # If this is a pair batch whose sibling already finished, prefer to keep within the window
+            if pair_id and not within_pair_window(pair_id, end_min):
+                # skip this slot; try next slot in the loop
+                continue
+
+            # commit allocation
+            remaining_kg[day, li, shift_idx] = avail - used
+            used_kg[day, li, shift_idx] = used_before + used
+            if first_free[li] == day * len(SHIFTS) + shift_idx:
+                advance_first_free(li)
+
+            if end_min > batch_last_end.get(badge["batch_id"], -math.inf):
+                batch_last_end[badge["batch_id"]] = end_min
+            log_slice(alloc_log, badge_pos, li, day, shift_idx, used, start_min, end_min)
+
+            remaining -= used
+        return remaining
+
+    for badge_pos, (_, badge) in enumerate(badges.iterrows()):
         color_family = badge["color_family_norm"]
         total_required = float(badge["required_qty"])
         batch_id = badge["batch_id"]
 
         # Decide pool:
-        if all_small:
-            target_pool = LINES
-        else:
-            target_pool = LINES_SMALL if 200 <= total_required <= 2000 else LINES_MAIN
+        target_pool, overflow_lines = badge_line_pools(total_required, all_small)
 
         assigned_line = get_or_assign_line_for_pool(color_family, target_pool)
 
+        # lines this badge may use (target pool + overflow) and the first day any of them has room
+        candidate_lines = list(target_pool) + overflow_lines
+
         remaining = total_required
-        current_date = plan_start
+        day = next_free_day(candidate_lines)
 
         # Determine whether this batch represents a single pair_id (typical for halves)
-        pair_ids = []
-        if pd.notna(badge.get("pair_id")) and badge.get("pair_id"):
-            pair_ids = [p for p in str(badge["pair_id"]).split(",") if p and p != "None"]
-        is_pair_batch = len(pair_ids) == 1
-        current_pair_id = pair_ids[0] if is_pair_batch else None
+        current_pair_id = single_pair_id(badge)
+        is_pair_batch = current_pair_id is not None
 
-        while remaining > 1e-6 and current_date <= horizon_end:
-            allocated_any = False
+        while remaining > 1e-6 and day < n_days:
+            before = remaining
 
             # Try assigned line first; if very big badge, allow spreading within the same pool
             pool_order = [assigned_line] + [l for l in target_pool if l != assigned_line]
@@ -690,166 +1266,390 @@ def process_orders_and_generate_plan(customer_file):
             for line in pool_order:
                 if remaining <= 1e-6:
                     break
-
-                for shift_idx, (shift_name, shift_start, shift_end) in enumerate(SHIFTS):
-                    if remaining <= 1e-6:
-                        break
-
-                    key = (current_date, line, shift_idx)
-                    if key not in capacity:
-                        capacity[key] = PER_SHIFT_CAPACITY[line]
-
-                    avail = capacity[key]
-                    if avail <= 1e-9:
-                        continue
-
-                    # allocate as much as possible in this shift
-                    used_before = slot_used.get(key, 0.0)
-                    per_shift_cap = PER_SHIFT_CAPACITY[line]
-                    free_now = max(0.0, per_shift_cap - used_before)
-                    if free_now <= 1e-9:
-                        continue
-
-                    used = min(avail, remaining, free_now)
-                    if used <= 1e-9:
-                        continue
-
-                    # compute start/end times for this allocation slice
-                    shift_day_start = datetime.combine(current_date, datetime.min.time()) + timedelta(minutes=shift_start)
-                    start_offset_min = (used_before / per_shift_cap) * SHIFT_DURATION_MIN
-                    duration_min = (used / per_shift_cap) * SHIFT_DURATION_MIN
-
-                    start_dt = shift_day_start + timedelta(minutes=start_offset_min)
-                    end_dt = start_dt + timedelta(minutes=duration_min)
-
-                    # If this is a pair batch whose sibling already finished, prefer to keep within the window
-                    if is_pair_batch and current_pair_id:
-                        if not within_pair_window(current_pair_id, end_dt):
-                            # skip this slot; try next slot in the loop
-                            continue
-
-                    # commit allocation
-                    capacity[key] -= used
-                    slot_used[key] = used_before + used
-
-                    alloc_rows.append({
-                        "batch_id": batch_id,
-                        "orders": badge["order_id"],
-                        "line": line,
-                        "date": current_date,
-                        "shift": shift_name,
-                        "allocated_kg": used,
-                        "start_dt": start_dt,
-                        "end_dt": end_dt,
-                        "color_code": badge.get("color_code"),
-                        "color_family": color_family,
-                        "count": badge["count"],
-                        "blend": badge["blend"],
-                        "yarn_type": badge["yarn_type"],
-                        "pair_id": current_pair_id,
-                        "pair_member": badge.get("pair_member")
-                    })
-
-                    remaining -= used
-                    allocated_any = True
+                remaining = fill_line_day(badge_pos, badge, line, day, remaining, current_pair_id)
 
             # Pass 2: small batch overflow to main lines (existing behaviour)
-            if (remaining > 1e-6) and (not all_small) and (200 <= total_required <= 2000):
-                overflow_lines = [l for l in LINES_MAIN if l not in target_pool]  # big lines
+            if remaining > 1e-6:
                 for line in overflow_lines:
                     if remaining <= 1e-6:
                         break
-                    for shift_idx, (shift_name, shift_start, shift_end) in enumerate(SHIFTS):
-                        if remaining <= 1e-6:
-                            break
-                        key = (current_date, line, shift_idx)
-                        if key not in capacity:
-                            capacity[key] = PER_SHIFT_CAPACITY[line]
-                        avail = capacity[key]
-                        if avail <= 1e-9:
-                            continue
-
-                        used_before = slot_used.get(key, 0.0)
-                        per_shift_cap = PER_SHIFT_CAPACITY[line]
-                        free_now = max(0.0, per_shift_cap - used_before)
-                        if free_now <= 1e-9:
-                            continue
-
-                        used = min(avail, remaining, free_now)
-                        if used <= 1e-9:
-                            continue
-
-                        shift_day_start = datetime.combine(current_date, datetime.min.time()) + timedelta(minutes=shift_start)
-                        start_offset_min = (used_before / per_shift_cap) * SHIFT_DURATION_MIN
-                        duration_min = (used / per_shift_cap) * SHIFT_DURATION_MIN
-
-                        start_dt = shift_day_start + timedelta(minutes=start_offset_min)
-                        end_dt = start_dt + timedelta(minutes=duration_min)
-
-                        if is_pair_batch and current_pair_id:
-                            if not within_pair_window(current_pair_id, end_dt):
-                                continue
-
-                        capacity[key] -= used
-                        slot_used[key] = used_before + used
-
-                        alloc_rows.append({
-                            "batch_id": batch_id,
-                            "orders": badge["order_id"],
-                            "line": line,
-                            "date": current_date,
-                            "shift": shift_name,
-                            "allocated_kg": used,
-                            "start_dt": start_dt,
-                            "end_dt": end_dt,
-                            "color_code": badge.get("color_code"),
-                            "color_family": color_family,
-                            "count": badge["count"],
-                            "blend": badge["blend"],
-                            "yarn_type": badge["yarn_type"],
-                            "pair_id": current_pair_id,
-                            "pair_member": badge.get("pair_member")
-                        })
-
-                        remaining -= used
-                        allocated_any = True
-
-            if not allocated_any:
-                current_date += timedelta(days=1)
+                    remaining = fill_line_day(badge_pos, badge, line, day, remaining, current_pair_id)
+
+            if remaining == before:
+                day = max(day + 1, next_free_day(candidate_lines))
+
+        if remaining > 1e-6:
+            log_unplaced(alloc_log, badge_pos, remaining)
 
         # After batch allocation, if this is the FIRST half of a pair (no window yet), set the window
+        # completion time = last end minute among this batch's allocations
+        last_end = batch_last_end.get(batch_id)
         if is_pair_batch and current_pair_id and current_pair_id not in pair_finish_window:
-            # completion time = last end_dt among this batch's allocations
-            last_end = None
-            for r in alloc_rows:
-                if r["batch_id"] == batch_id:
-                    if last_end is None or r["end_dt"] > last_end:
-                        last_end = r["end_dt"]
-            if last_end:
+            if last_end is not None:
                 pair_finish_window[current_pair_id] = {
                     "first_end": last_end,
-                    "deadline": last_end + timedelta(hours=24)
+                    "deadline": last_end + PAIR_WINDOW_MIN
                 }
 
         # If we failed to respect window for second half (because no slot met it), record a warning.
         if is_pair_batch and current_pair_id and current_pair_id in pair_finish_window:
-            # If this batch finished after the deadline, we warn.
-            my_end = None
-            for r in alloc_rows:
-                if r["batch_id"] == batch_id:
-                    if my_end is None or r["end_dt"] > my_end:
-                        my_end = r["end_dt"]
-            if my_end and my_end > pair_finish_window[current_pair_id]["deadline"]:
+            if last_end is not None and last_end > pair_finish_window[current_pair_id]["deadline"]:
                 multiply_pair_warnings.append({
                     "pair_id": current_pair_id,
                     "batch_id": batch_id,
                     "first_end": pair_finish_window[current_pair_id]["first_end"],
                     "deadline": pair_finish_window[current_pair_id]["deadline"],
-                    "actual_end": my_end,
+                    "actual_end": last_end,
                     "note": "Could not finish within 24h window; placed ASAP."
                 })
 
-    df_alloc = pd.DataFrame(alloc_rows)
+    multiply_pair_warnings = pd.DataFrame(multiply_pair_warnings)
+    for col in ("first_end", "deadline", "actual_end"):
+        if col in multiply_pair_warnings:
+            multiply_pair_warnings[col] = minutes_to_datetimes(plan_start, multiply_pair_warnings[col])
+    return alloc_log, multiply_pair_warnings
+
+def _minutes_to_slices(start_min: int, end_min: int, qty: float):
+    """Split a continuous run on one line into per-shift (day, shift_idx, start, end, kg) slices."""
+    total = end_min - start_min
+    t = start_min
+    while t < end_min:
+        day, in_day = divmod(t, 1440)
+        shift_idx = min(in_day // SHIFT_DURATION_MIN, len(SHIFTS) - 1)
+        boundary = day * 1440 + SHIFTS[shift_idx][2]
+        nxt = min(end_min, boundary)
+        yield day, shift_idx, t, nxt, qty * (nxt - t) / total
+        t = nxt
+
+def schedule_cpsat(badges: pd.DataFrame, plan_start, time_limit_s: float = CPSAT_TIME_LIMIT_S,
+                   num_workers: int = CPSAT_NUM_WORKERS):
+    """
+    Optimizing scheduler on OR-Tools CP-SAT.
+    Each badge runs as one uninterrupted block on a single line of its pool (badge_line_pools);
+    a line runs at PER_SHIFT_CAPACITY kg per shift and one badge at a time, over the same
+    HORIZON_DAYS window as the greedy plan. Single-pair badges must finish within
+    PAIR_WINDOW_MIN of their sibling. Badges with no kg to make are left out.
+    Each colour family runs as one campaign per line; a circuit over the line's families orders
+    the campaigns, so its arcs are the line's changeovers, costed on CHANGEOVER_COST.
+    Solves lexicographically, each stage keeping the previous one's result: unscheduled badges,
+    then late badges (end after earliest_due), then changeovers plus makespan, with total
+    completion time breaking ties. CPSAT_STAGE_TIME_SHARE splits time_limit_s between stages.
+    Returns (alloc_log, multiply_pair_warnings, label) over `badges` or None when no solution was found.
+    """
+    if cp_model is None or badges.empty:
+        return None
+
+    n_days = HORIZON_DAYS + 1
+    horizon = n_days * 1440
+    all_small = all_badges_small(badges)
+    rows = badges.reset_index(drop=True)
+
+    model = cp_model.CpModel()
+    makespan = model.new_int_var(0, horizon, "makespan")
+    presence, starts, ends, durations = {}, {}, {}, {}
+    line_intervals = {ln: [] for ln in LINES}
+    badge_end, scheduled = {}, {}  # by row of `rows`, for badges with kg to make
+    campaigns, campaign_members = {}, {}  # (line, colour family) -> (used, start, end) / presence literals
+
+    for b, badge in rows.iterrows():
+        qty = float(badge["required_qty"])
+        if not qty > 0:
+            continue
+        target_pool, overflow_lines = badge_line_pools(qty, all_small)
+        end_b = model.new_int_var(0, horizon, f"end_{b}")
+        lits = []
+        for ln in list(target_pool) + overflow_lines:
+            dur = max(1, math.ceil(qty / PER_SHIFT_CAPACITY[ln] * SHIFT_DURATION_MIN))
+            if dur > horizon:
+                continue
+            p = model.new_bool_var(f"p_{b}_{ln}")
+            st_ = model.new_int_var(0, horizon - dur, f"s_{b}_{ln}")
+            en = model.new_int_var(dur, horizon, f"e_{b}_{ln}")
+            line_intervals[ln].append(model.new_optional_interval_var(st_, dur, en, p, f"i_{b}_{ln}"))
+            model.add(end_b == en).only_enforce_if(p)
+            model.add(makespan >= en).only_enforce_if(p)
+            presence[b, ln], starts[b, ln], ends[b, ln], durations[b, ln] = p, st_, en, dur
+            lits.append(p)
+            key = (ln, badge["color_family_norm"])
+            if key not in campaigns:
+                i = len(campaigns)
+                campaigns[key] = (model.new_bool_var(f"c_{i}"), model.new_int_var(0, horizon, f"cs_{i}"),
+                                  model.new_int_var(0, horizon, f"ce_{i}"))
+                campaign_members[key] = []
+            used, c_start, c_end = campaigns[key]
+            model.add_implication(p, used)
+            model.add(c_start <= st_).only_enforce_if(p)
+            model.add(en <= c_end).only_enforce_if(p)
+            campaign_members[key].append(p)
+        is_sched = model.new_bool_var(f"sched_{b}")
+        model.add(sum(lits) == is_sched)
+        model.add(end_b == 0).only_enforce_if(~is_sched)
+        badge_end[b] = end_b
+        scheduled[b] = is_sched
+
+    # Colour campaigns: node 0 is the line's idle state, node i its i-th colour family. A family the
+    # line does not run loops on itself; an arc i -> j puts campaign j after campaign i.
+    line_arcs = {}  # line -> (families, {(i, j): literal})
+    changeover_arcs = []  # (literal, CHANGEOVER_COST in tenths)
+    for ln in LINES:
+        model.add_no_overlap(line_intervals[ln])
+        fams = [f for (l, f) in campaigns if l == ln]
+        if not fams:
+            continue
+        cost = changeover_cost_matrix(fams)
+        arcs = {(0, 0): model.new_bool_var(f"idle_{ln}")}
+        for i, f in enumerate(fams, start=1):
+            used, _, c_end = campaigns[ln, f]
+            model.add_bool_or(campaign_members[ln, f]).only_enforce_if(used)
+            arcs[i, i] = ~used
+            arcs[0, i] = model.new_bool_var(f"first_{ln}_{i}")
+            arcs[i, 0] = model.new_bool_var(f"last_{ln}_{i}")
+            for j, g in enumerate(fams, start=1):
+                if i != j:
+                    x = model.new_bool_var(f"x_{ln}_{i}_{j}")
+                    model.add(c_end <= campaigns[ln, g][1]).only_enforce_if(x)
+                    arcs[i, j] = x
+                    changeover_arcs.append((x, round(10 * cost[i - 1, j - 1])))
+        model.add_circuit([(i, j, lit) for (i, j), lit in arcs.items()])
+        line_arcs[ln] = (fams, arcs)
+
+    # Pair window: halves of a double yarn finish within PAIR_WINDOW_MIN of each other
+    pair_members = {}
+    for b, badge in rows.iterrows():
+        pid = single_pair_id(badge)
+        if pid is not None and b in scheduled:
+            pair_members.setdefault(pid, []).append(b)
+    for members in pair_members.values():
+        for i in range(len(members)):
+            for j in range(i + 1, len(members)):
+                a, c = members[i], members[j]
+                both = [scheduled[a], scheduled[c]]
+                model.add(badge_end[a] - badge_end[c] <= PAIR_WINDOW_MIN).only_enforce_if(both)
+                model.add(badge_end[c] - badge_end[a] <= PAIR_WINDOW_MIN).only_enforce_if(both)
+
+    # Lateness against earliest due date (end of that day)
+    late = []
+    if "earliest_due" in rows.columns:
+        for b, due in rows["earliest_due"].items():
+            if b not in scheduled or due is None or pd.isna(due):
+                continue
+            due_min = ((pd.Timestamp(due).date() - plan_start).days + 1) * 1440
+            is_late = model.new_bool_var(f"late_{b}")
+            model.add(badge_end[b] <= max(0, due_min)).only_enforce_if([scheduled[b], ~is_late])
+            late.append((b, due_min, is_late))
+
+    # Complete, feasible hint: list-schedule badges in their sequence order on the earliest-free
+    # allowed line that has not already finished the badge's colour campaign, delaying a pair member
+    # so it ends no earlier than PAIR_WINDOW_MIN before its sibling
+    line_free = {ln: 0 for ln in LINES}
+    line_order = {ln: [] for ln in LINES}  # colour families in run order
+    spans = {}  # (line, family) -> [first start, last end]
+    hint_end = [0] * len(rows)
+    pair_of = {b: m for m in pair_members.values() for b in m}
+    for b in scheduled:
+        fam = rows.at[b, "color_family_norm"]
+        sibling_ends = [hint_end[o] for o in pair_of.get(b, []) if o < b and hint_end[o]]
+        options = []
+        for ln in LINES:
+            if (b, ln) in presence and fam not in line_order[ln][:-1]:
+                start = line_free[ln]
+                if sibling_ends:
+                    start = max(start, max(sibling_ends) - PAIR_WINDOW_MIN - durations[b, ln])
+                end = start + durations[b, ln]
+                late_for_pair = bool(sibling_ends) and end > min(sibling_ends) + PAIR_WINDOW_MIN
+                options.append((late_for_pair, end, start, ln))
+        # a member that cannot meet its sibling's window is left out of the hint (unscheduled)
+        options = sorted(o for o in options if o[1] <= horizon and not o[0])
+        chosen = options[0] if options else None
+        for ln in LINES:
+            if (b, ln) not in presence:
+                continue
+            on = chosen is not None and ln == chosen[3]
+            start = chosen[2] if on else 0
+            model.add_hint(presence[b, ln], on)
+            model.add_hint(starts[b, ln], start)
+            model.add_hint(ends[b, ln], start + durations[b, ln])
+        if chosen is not None:
+            _, hint_end[b], start, ln = chosen
+            line_free[ln] = hint_end[b]
+            if not line_order[ln] or line_order[ln][-1] != fam:
+                line_order[ln].append(fam)
+                spans[ln, fam] = [start, hint_end[b]]
+            spans[ln, fam][1] = hint_end[b]
+        model.add_hint(scheduled[b], chosen is not None)
+        model.add_hint(badge_end[b], hint_end[b])
+    for key, (used, c_start, c_end) in campaigns.items():
+        model.add_hint(used, key in spans)
+        model.add_hint(c_start, spans[key][0] if key in spans else 0)
+        model.add_hint(c_end, spans[key][1] if key in spans else 0)
+    for ln, (fams, arcs) in line_arcs.items():
+        node = {f: i for i, f in enumerate(fams, start=1)}
+        path = [0] + [node[f] for f in line_order[ln]] + [0]
+        taken = set(zip(path, path[1:])) if line_order[ln] else {(0, 0)}
+        for (i, j), lit in arcs.items():
+            if i != j or i == 0:
+                model.add_hint(lit, (i, j) in taken)
+    for b, due_min, is_late in late:
+        model.add_hint(is_late, hint_end[b] > due_min)
+    model.add_hint(makespan, max(hint_end, default=0))
+    hint_objectives = [sum(1 for b in scheduled if not hint_end[b]),
+                       sum(hint_end[b] > due_min for b, due_min, _ in late)]
+
+    # Lexicographic stages; each later stage may not give back what an earlier one reached
+    changeovers = sum(c * x for x, c in changeover_arcs)
+    stages = [
+        sum(1 - x for x in scheduled.values()),
+        sum(x for _, _, x in late),
+        # changeover cost is in tenths, so makespan and completion are scaled to match
+        len(scheduled) * (CPSAT_CHANGEOVER_MIN * changeovers + 10 * makespan) + 10 * sum(badge_end.values()),
+    ]
+    deadline = time.monotonic() + float(time_limit_s)
+    solver, statuses = None, []
+    for k, (objective, share) in enumerate(zip(stages, CPSAT_STAGE_TIME_SHARE)):
+        model.minimize(objective)
+        stage = cp_model.CpSolver()
+        stage.parameters.max_time_in_seconds = max(0.1, (deadline - time.monotonic()) * share)
+        stage.parameters.num_workers = int(num_workers)
+        status = stage.solve(model)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            break
+        solver = stage
+        statuses.append(stage.status_name(status).lower())
+        best = round(stage.objective_value)
+        model.add(objective <= best)
+        # the next stage starts from this solution unless the list-schedule hint was already as good
+        if k + 1 == len(stages) or (k < len(hint_objectives) and best >= hint_objectives[k]):
+            continue
+        hint_objectives = []
+        solution = list(stage.response_proto.solution)
+        model.clear_hints()
+        model.proto.solution_hint.vars.extend(range(len(solution)))
+        model.proto.solution_hint.values.extend(solution)
+    if solver is None:
+        return None
+
+    alloc_log = new_alloc_log()
+    line_pos = {ln: i for i, ln in enumerate(LINES)}
+    placed = []
+    for (b, ln), p in presence.items():
+        if solver.value(p):
+            placed.append((solver.value(starts[b, ln]), b, ln))
+    for b, is_sched in scheduled.items():
+        if not solver.value(is_sched):
+            log_unplaced(alloc_log, b, float(rows.at[b, "required_qty"]))
+    for start_min, b, ln in sorted(placed):
+        end_min = solver.value(ends[b, ln])
+        qty = float(rows.at[b, "required_qty"])
+        for day, shift_idx, s0, s1, kg in _minutes_to_slices(start_min, end_min, qty):
+            log_slice(alloc_log, b, line_pos[ln], day, shift_idx, kg, s0, s1)
+
+    n_changeovers = sum(solver.value(x) for x, _ in changeover_arcs)
+    label = (f"CP-SAT ({'/'.join(statuses)}: {sum(1 for x in scheduled.values() if not solver.value(x))} unscheduled, "
+             f"{sum(solver.value(x) for _, _, x in late)} late, {n_changeovers} changeovers)")
+    return alloc_log, pd.DataFrame(), label
+
+# ========================================
+# MAIN PROCESSING FUNCTION
+# ========================================
+@st.cache_data
+def process_orders_and_generate_plan(customer_file, scheduler: str = "greedy",
+                                     cpsat_time_limit_s: float = CPSAT_TIME_LIMIT_S,
+                                     cpsat_workers: int = CPSAT_NUM_WORKERS,
+                                     sequencing: str = "color",
+                                     blend_auto_score: float = BLEND_FUZZY_AUTO_SCORE):
+    """
+    Returns (results_dict, not_matched_df, error_msg_or_none); not_matched_df also lists batches
+    the scheduler could not place within the horizon (batch_id set).
+    `scheduler` is "greedy" or "cp-sat"; CP-SAT falls back to greedy when it finds no solution.
+    `sequencing` is "color" or "due-window" (see sequence_badges).
+    `blend_auto_score` is the confidence at which a fuzzy composition match is applied.
+    """
+    try:
+        machines, throughput = load_machine_catalogue(MACHINE_FILE_PATH)
+    except FileNotFoundError:
+        return None, None, "Machine configuration file not found at ./reports/machine.xlsx"
+    except Exception as e:
+        return None, None, f"Error loading machine file: {str(e)}"
+    machine_index = build_machine_index(throughput)
+    count_index = build_count_index(throughput)
+
+    orders, load_err = load_customer_orders(customer_file)
+    if load_err:
+        return None, None, load_err
+
+    # ---- NEW: explode double yarn into pair members ----
+    orders = explode_double_yarn(orders)
+
+    # ── Split "Sample" single orders (0 < qty ≤ 200 kg) BEFORE matching/scheduling
+    samples_df = orders[(orders["Quantity"] > 0) & (orders["Quantity"] <= 200)].copy()
+    plan_orders = orders[~orders.index.isin(samples_df.index)].copy()
+
+    df_matched, df_unmatched, blend_log = calculate_hours_batch(plan_orders, machine_index, blend_auto_score, count_index)
+
+    # If there is nothing to schedule (except samples), still return usable payload
+    if df_matched.empty:
+        empty_results = {
+            "production_plan": pd.DataFrame(),
+            "batch_status": pd.DataFrame(),
+            "line_utilization": pd.DataFrame(),
+            "color_changeover": pd.DataFrame(),
+            "line_color_summary": pd.DataFrame(),
+            "multiply_pair_warnings": pd.DataFrame(),
+            "not_matched": df_unmatched,
+            "blend_matches": blend_log,
+            "total_pi": int(plan_orders["PI NO"].nunique()) if "PI NO" in plan_orders.columns else len(plan_orders),
+            "samples": samples_df.reset_index(drop=True)
+        }
+        return empty_results, df_unmatched, None
+
+    # Build batches ("badges"): native reductions, then one pass for the string-joined columns
+    badge_keys = ["count", "yarn_type", "blend", "color_code", "color_family"]
+    grouped = df_matched.assign(_interpolated=df_matched["throughput_source"].eq("interpolated")).groupby(badge_keys)
+    badges = grouped.agg(
+        required_qty=("required_qty", "sum"),
+        calculated_hours=("calculated_hours", "sum"),
+        earliest_due=("due_date", "min"),
+        _interpolated=("_interpolated", "max"),  # string max per group is slow; reduce a bool instead
+    ).reset_index()
+    badges["throughput_source"] = np.where(badges.pop("_interpolated"), "interpolated", "exact")
+    codes = grouped.ngroup().fillna(-1).to_numpy(dtype=int)  # rows with a missing key belong to no badge
+    badges.insert(len(badge_keys), "order_id", _join_per_group(codes, df_matched["order_id"].astype(str), len(badges), ", "))
+    badges.insert(len(badge_keys) + 3, "pair_id", _join_per_group(codes, df_matched["pair_id"], len(badges), ",", distinct=True))
+    badges.insert(len(badge_keys) + 4, "pair_member", _join_per_group(codes, df_matched["pair_member"], len(badges), ",", distinct=True))
+
+    color_code = badges["color_code"].astype(object)
+    badges["batch_id"] = (
+        pd.to_numeric(badges["count"]).astype("int64").astype(str)
+        + "-" + badges["blend"].astype(str).str.split().str[0].fillna("")
+        + "-" + color_code.astype(str).where(color_code.astype(bool), "")
+    ).str.replace(" ", "_", regex=False)
+
+    badges["color_family_norm"] = badges["color_family"].fillna("Unknown").astype(str).str.strip().str.title()
+    badges["_due_sort"] = badges["earliest_due"].fillna(pd.Timestamp.max)
+    badges = sequence_badges(badges, sequencing)
+
+    plan_start = datetime.now().date()
+
+    if scheduler == "cp-sat":
+        sched = schedule_cpsat(badges, plan_start, time_limit_s=cpsat_time_limit_s, num_workers=cpsat_workers)
+        if sched is None:
+            if cp_model is None:
+                scheduler_used = "greedy (OR-Tools not installed)"
+            else:
+                scheduler_used = f"greedy (CP-SAT found no solution within {cpsat_time_limit_s:g}s)"
+            alloc_log, multiply_pair_warnings = schedule_greedy(badges, plan_start)
+        else:
+            alloc_log, multiply_pair_warnings, scheduler_used = sched
+    else:
+        scheduler_used = "greedy"
+        alloc_log, multiply_pair_warnings = schedule_greedy(badges, plan_start)
+
+    df_alloc = alloc_log_frame(alloc_log, badges, plan_start)
+
+    # Work the scheduler could not place is reported with the exceptions
+    df_unplaced = unplaced_frame(alloc_log, badges)
+    if not df_unplaced.empty:
+        df_unmatched = df_unplaced if df_unmatched.empty else pd.concat([df_unmatched, df_unplaced], ignore_index=True)
 
     # Build results, even if no allocations (only samples)
     if df_alloc.empty:
@@ -861,71 +1661,76 @@ def process_orders_and_generate_plan(customer_file):
             "line_color_summary": pd.DataFrame(),
             "multiply_pair_warnings": pd.DataFrame(multiply_pair_warnings),
             "not_matched": df_unmatched,
+            "blend_matches": blend_log,
             "total_pi": int(plan_orders["PI NO"].nunique()) if "PI NO" in plan_orders.columns else len(plan_orders),
-            "samples": samples_df.reset_index(drop=True)
+            "samples": samples_df.reset_index(drop=True),
+            "scheduler": scheduler_used
         }
         return results, df_unmatched, None
 
     df_alloc["date"] = pd.to_datetime(df_alloc["date"])
 
     # Line-specific hours
-    df_alloc["no_of_hours"] = df_alloc.apply(
-        lambda r: (r["allocated_kg"] / PER_SHIFT_CAPACITY[r["line"]]) * (SHIFT_DURATION_MIN / 60.0),
-        axis=1
-    )
+    df_alloc["no_of_hours"] = (df_alloc["allocated_kg"] / df_alloc["line"].map(PER_SHIFT_CAPACITY)) * (SHIFT_DURATION_MIN / 60.0)
 
-    # Batch status
-    badge_status = []
-    for batch_id, g in df_alloc.groupby("batch_id"):
-        # Get first row from badges for metadata
-        br = badges[badges["batch_id"] == batch_id].iloc[0]
-        badge_status.append({
-            "batch_id": batch_id,
-            "orders": br["order_id"],
-            "count": br["count"],
-            "blend": br["blend"],
-            "yarn_type": br["yarn_type"],
-            "color_code": br.get("color_code"),
-            "color_family": br.get("color_family"),
-            "pair_id": br.get("pair_id"),
-            "pair_member": br.get("pair_member"),
-            "total_qty": round(g["allocated_kg"].sum(), 2),
-            "completion_dt": g["end_dt"].max(),
-            "hours_taken": round(g["no_of_hours"].sum(), 3)
-        })
-    df_badge_status = pd.DataFrame(badge_status)
-
-    # Line utilization (per-line daily capacity)
-    util_rows = []
-    for line in LINES:
-        day_cap = LINE_CONFIG[line]["daily_capacity_kg"]
-        for d in sorted(df_alloc["date"].dt.date.unique()):
-            used = df_alloc[(df_alloc["line"] == line) & (df_alloc["date"].dt.date == d)]["allocated_kg"].sum()
-            util_rows.append({
-                "line": line,
-                "date": d,
-                "capacity_kg": day_cap,
-                "used_kg": round(used, 2),
-                "util_pct": round((used / day_cap) * 100, 2) if day_cap > 0 else 0.0
-            })
-    df_line_util = pd.DataFrame(util_rows)
-
-    # Color changeover log
-    color_changes = []
-    for line in LINES:
-        line_alloc = df_alloc[df_alloc["line"] == line].sort_values(["date", "shift"])
-        prev_color = None
-        for _, row in line_alloc.iterrows():
-            if prev_color and prev_color != row["color_family"]:
-                color_changes.append({
-                    "line": line,
-                    "date": row["date"].date() if hasattr(row["date"], "date") else row["date"],
-                    "shift": row["shift"],
-                    "from_color": prev_color,
-                    "to_color": row["color_family"]
-                })
-            prev_color = row["color_family"]
-    df_color_changes = pd.DataFrame(color_changes)
+    # Batch status: one aggregation per batch_id, joined to the badge metadata (first badge per batch_id)
+    per_batch = df_alloc.groupby("batch_id").agg(
+        total_qty=("allocated_kg", "sum"),
+        completion_dt=("end_dt", "max"),
+        hours_taken=("no_of_hours", "sum"),
+    )
+    meta = badges.drop_duplicates("batch_id").set_index("batch_id").reindex(per_batch.index)
+    df_badge_status = pd.DataFrame({
+        "batch_id": per_batch.index.to_numpy(),
+        "orders": meta["order_id"].to_numpy(),
+        "count": meta["count"].to_numpy(),
+        "blend": meta["blend"].to_numpy(),
+        "yarn_type": meta["yarn_type"].to_numpy(),
+        "color_code": meta["color_code"].to_numpy(),
+        "color_family": meta["color_family"].to_numpy(),
+        "pair_id": meta["pair_id"].to_numpy(),
+        "pair_member": meta["pair_member"].to_numpy(),
+        "total_qty": np.round(per_batch["total_qty"].to_numpy(), 2),
+        "completion_dt": per_batch["completion_dt"].to_numpy(),
+        "hours_taken": np.round(per_batch["hours_taken"].to_numpy(), 3),
+        "due_date": meta["earliest_due"].to_numpy(),
+        "throughput_source": meta["throughput_source"].to_numpy(),
+    })
+
+    # Lateness: a batch is late when it completes after the end of its earliest due date
+    due = pd.to_datetime(df_badge_status["due_date"], errors="coerce")
+    days_late = (df_badge_status["completion_dt"].dt.normalize() - due).dt.days
+    df_badge_status["days_late"] = days_late.clip(lower=0)
+    df_badge_status["is_late"] = days_late > 0
+    df_badge_status["due_date"] = due.dt.date
+
+    # Line utilization (per-line daily capacity): one groupby, reindexed to every line x plan date
+    alloc_day = df_alloc["date"].dt.date
+    grid = pd.MultiIndex.from_product([LINES, sorted(alloc_day.unique())], names=["line", "date"])
+    used = df_alloc.groupby([df_alloc["line"], alloc_day])["allocated_kg"].sum().reindex(grid, fill_value=0.0)
+    df_line_util = grid.to_frame(index=False)
+    df_line_util["capacity_kg"] = df_line_util["line"].map({ln: LINE_CONFIG[ln]["daily_capacity_kg"] for ln in LINES})
+    used_kg = used.to_numpy()
+    day_cap = df_line_util["capacity_kg"].to_numpy()
+    df_line_util["used_kg"] = np.round(used_kg, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df_line_util["util_pct"] = np.where(day_cap > 0, np.round((used_kg / day_cap) * 100, 2), 0.0)
+
+    # Color changeover log: one stable sort by (line, start time), then compare with the previous slot on the line
+    line_rank = df_alloc["line"].map({ln: i for i, ln in enumerate(LINES)})
+    seq = df_alloc.assign(_line_rank=line_rank).sort_values(["_line_rank", "start_dt"], kind="stable")
+    prev_color = seq.groupby("_line_rank", sort=False)["color_family"].shift()
+    changed = prev_color.notna() & prev_color.astype(bool) & (prev_color != seq["color_family"])
+    changes = seq[changed]
+    df_color_changes = pd.DataFrame({
+        "line": changes["line"].to_numpy(),
+        "date": changes["date"].dt.date.to_numpy(),
+        "shift": changes["shift"].to_numpy(),
+        "from_color": prev_color[changed].to_numpy(),
+        "to_color": changes["color_family"].to_numpy(),
+        "changeover_dt": changes["start_dt"].to_numpy(),
+    })
+    changeover_counts = changes["line"].value_counts().reindex(LINES, fill_value=0)
 
     # Line color summary
     line_color_summary = []
@@ -949,11 +1754,14 @@ def process_orders_and_generate_plan(customer_file):
         "batch_status": df_badge_status,
         "line_utilization": df_line_util,
         "color_changeover": df_color_changes,
+        "changeover_counts": changeover_counts,
         "line_color_summary": df_line_color_summary,
         "multiply_pair_warnings": pd.DataFrame(multiply_pair_warnings),
         "not_matched": df_unmatched,
+        "blend_matches": blend_log,
         "total_pi": total_pi,
-        "samples": samples_df.reset_index(drop=True)
+        "samples": samples_df.reset_index(drop=True),
+        "scheduler": scheduler_used
     }
     return results, df_unmatched, None
 
@@ -973,21 +1781,40 @@ with col2:
     <div class="upload-card">
         <div style="font-size:2.2rem">📁</div>
         <div style="font-size:1.2rem;font-weight:600;margin-top:0.5rem">Upload Customer Order File</div>
-        <div style="color:#666;margin-top:0.4rem">Excel file (any sheet); headers will be auto-detected</div>
+        <div style="color:#666;margin-top:0.4rem">Excel (any sheet), CSV or Parquet; headers will be auto-detected</div>
     </div>
     """, unsafe_allow_html=True)
 
-customer_file = st.file_uploader("Choose file", type=["xlsx", "xls"], label_visibility="collapsed")
+customer_file = st.file_uploader("Choose file", type=ORDER_FILE_TYPES, label_visibility="collapsed")
 
 if customer_file:
     st.markdown("<br>", unsafe_allow_html=True)
     col1, col2, col3 = st.columns([1.5, 1, 1.5])
     with col2:
+        with st.expander("⚙️ Scheduler settings"):
+            scheduler_label = st.radio("Scheduling engine", list(SCHEDULER_MODES.keys()), horizontal=True,
+                                       help="CP-SAT minimizes unscheduled batches, then late batches, then colour "
+                                            "changeovers plus makespan. Each batch runs whole on one line, so the greedy "
+                                            "plan, which splits batches across lines, can finish a few hours earlier.")
+            scheduler = SCHEDULER_MODES[scheduler_label]
+            cpsat_time_limit_s = st.number_input("CP-SAT time limit (s)", min_value=1.0, max_value=600.0,
+                                                 value=CPSAT_TIME_LIMIT_S, step=5.0, disabled=scheduler != "cp-sat")
+            cpsat_workers = int(st.number_input("CP-SAT worker threads", min_value=1, max_value=max(64, CPSAT_NUM_WORKERS),
+                                                value=CPSAT_NUM_WORKERS, step=1, disabled=scheduler != "cp-sat"))
+            if scheduler == "cp-sat" and cp_model is None:
+                st.warning("OR-Tools is not installed; the greedy scheduler will be used.")
+            sequencing_label = st.radio("Batch sequencing", list(SEQUENCING_MODES.keys()), horizontal=True)
+            sequencing = SEQUENCING_MODES[sequencing_label]
+            blend_auto_score = st.slider("Fuzzy blend match confidence", min_value=BLEND_FUZZY_MIN_AUTO_SCORE,
+                                         max_value=1.0, value=BLEND_FUZZY_AUTO_SCORE, step=0.05,
+                                         help="Unmapped compositions whose closest BLEND_MAPPING entry scores at least this are planned with it.")
         generate_btn = st.button("🚀 Generate Plan", type="primary", use_container_width=True)
 
     if generate_btn:
         with st.spinner("🔄 Processing orders and optimizing schedule..."):
-            results, not_matched_df, error = process_orders_and_generate_plan(customer_file)
+            results, not_matched_df, error = process_orders_and_generate_plan(
+                customer_file, scheduler, cpsat_time_limit_s, cpsat_workers, sequencing, blend_auto_score
+            )
 
         if error:
             st.error(f"❌ {error}")
@@ -1003,6 +1830,8 @@ if customer_file:
             def fmt(d): return f"{d.day}/{d.month}/{d.year}"
             period_str = f"{fmt(period_start)} - {fmt(period_end)}"
             st.success(f"✅ Production plan for period {period_str} generated successfully!")
+            if results.get("scheduler"):
+                st.caption(f"Scheduler: {results['scheduler']}")
             st.markdown("<br>", unsafe_allow_html=True)
 
             # Top metrics
@@ -1073,6 +1902,14 @@ if customer_file:
                     batch_df = batch_df.reindex(columns=[c for c in front if c in batch_df.columns] + rest + extra)
                     batch_df = batch_df.sort_values(['yarn_type'])
                     st.dataframe(batch_df.reset_index(drop=True), use_container_width=True, height=450)
+                    if 'is_late' in batch_df.columns and batch_df['is_late'].any():
+                        late_df = batch_df[batch_df['is_late']]
+                        st.warning(f"{len(late_df)} batch(es) finish after their due date "
+                                   f"(max {int(late_df['days_late'].max())} day(s) late).")
+                    if 'throughput_source' in batch_df.columns and (batch_df['throughput_source'] == "interpolated").any():
+                        n_est = int((batch_df['throughput_source'] == "interpolated").sum())
+                        st.info(f"{n_est} batch(es) use a count missing from the machine catalogue; "
+                                f"their hours are interpolated from the neighbouring counts.")
                 else:
                     st.info("No batch summary available.")
 
@@ -1096,7 +1933,9 @@ if customer_file:
                     if 'date' in cc.columns:
                         cc['date'] = pd.to_datetime(cc['date']).dt.date
                     st.dataframe(cc.reset_index(drop=True), use_container_width=True, height=450)
-                    st.info(f"Total color changeovers: {len(cc)}")
+                    per_line = results.get('changeover_counts')
+                    per_line_str = "" if per_line is None else " (" + ", ".join(f"{ln}: {n}" for ln, n in per_line.items()) + ")"
+                    st.info(f"Total color changeovers: {len(cc)}{per_line_str}")
                 else:
                     st.success("🎉 No color changeovers — optimal batching achieved.")
 
@@ -1146,9 +1985,20 @@ if customer_file:
                 not_matched = results.get('not_matched', pd.DataFrame())
                 if not not_matched.empty:
                     st.dataframe(not_matched.reset_index(drop=True), use_container_width=True, height=450)
-                    st.warning(f"{len(not_matched)} orders could not be matched. Check 'reason' column for details.")
+                    n_unplaced = int(not_matched["batch_id"].notna().sum()) if "batch_id" in not_matched.columns else 0
+                    if n_unplaced:
+                        st.warning(f"{n_unplaced} batch(es) could not be scheduled within {HORIZON_DAYS} days.")
+                    if len(not_matched) > n_unplaced:
+                        st.warning(f"{len(not_matched) - n_unplaced} orders could not be matched. Check 'reason' column for details.")
                 else:
                     st.success("No exceptions — all orders matched successfully.")
+                blend_matches = results.get('blend_matches', pd.DataFrame())
+                if not blend_matches.empty:
+                    st.markdown("**Fuzzy composition matches**")
+                    st.dataframe(blend_matches, use_container_width=True)
+                    n_applied = int((blend_matches["decision"] == "auto-applied").sum())
+                    st.info(f"{n_applied} composition(s) were planned via a fuzzy match; "
+                            f"{len(blend_matches) - n_applied} only suggested (see 'reason').")
 
             st.markdown("<br><br>", unsafe_allow_html=True)
             st.markdown('<div class="section-header">📥 Download Production Plan</div>', unsafe_allow_html=True)
@@ -1200,6 +2050,8 @@ if customer_file:
                     # Exceptions
                     if not results['not_matched'].empty:
                         results['not_matched'].to_excel(writer, sheet_name="NotMatchedOrders", index=False)
+                    if not results.get('blend_matches', pd.DataFrame()).empty:
+                        results['blend_matches'].to_excel(writer, sheet_name="BlendFuzzyMatches", index=False)
 
                 output.seek(0)
                 st.download_button(
@@ -1230,7 +2082,7 @@ else:
         st.markdown("""
         <div style="padding:1rem;border-radius:8px;box-shadow:0 2px 8px rgba(0,0,0,0.06)">
             <h3 style="color:#63913A;margin-top:0">📋 File Requirements</h3>
-            <p>Upload any Excel sheet; the app auto-detects the header row.</p>
+            <p>Upload any Excel sheet, CSV or Parquet export; the app auto-detects the header row.</p>
             <p><strong>Must include columns (any label variant):</strong></p>
             <ul>
                 <li>PI No</li><li>Yarn Count</li><li>Composition</li><li>Yarn Type</li><li>Quantity (kg)</li>